@@ -1,6 +1,7 @@
 from __future__ import print_function
 
 # Standard libraries
+import asyncio
 import os
 import tempfile
 import shutil
@@ -9,6 +10,8 @@ from uuid import uuid4
 from typing import Optional, Union, List
 from dotenv import load_dotenv
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # Third-party libraries
 
@@ -17,12 +20,17 @@ from pydantic import BaseModel
 from fastapi import HTTPException, Header, Depends, status
 
 # Local libraries
+from celery_config import celery_app
 from remove_silence import *
 from file_operations import *
 from communication import *
 from audio_processing import process_audio
+from audio_pipeline import validate_operations
 from video_processing import process_video
 from file_duration import *
+from silence_analysis import analyze_silence
+from utils.audio_encoding import validate_audio_quality
+from utils.silence_detector import STREAMING_DENOISE_ERROR, validate_cut_list
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -30,6 +38,11 @@ app = FastAPI()
 # Load environment variables
 load_dotenv()
 
+# /analyze-silence/ decodes whole files in the API process, so at most this
+# many run at once; further requests wait for a free slot
+ANALYZE_SILENCE_WORKERS = int(os.environ.get("ANALYZE_SILENCE_WORKERS", 2))
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYZE_SILENCE_WORKERS)
+
 
 class MediaDurationItem(BaseModel):
     media_url: Union[str, List[str]]
@@ -53,6 +66,8 @@ class VideoItem(BaseModel):
     generate_srt: Optional[bool] = False
     run_bulk: Optional[bool] = False
     input_video_urls: Optional[list] = None
+    streaming_detection: Optional[bool] = False
+    render_mode: Optional[str] = "moviepy"
 
 
 class AudioItem(BaseModel):
@@ -78,6 +93,40 @@ class AudioItem(BaseModel):
     background_audio_url: Optional[str] = None
     gain_during_overlay: Optional[float] = -10
     run_bulk: Optional[bool] = False
+    streaming_detection: Optional[bool] = False
+    # Ordered [{"task_type": ..., **parameters}] run as one audio_pipeline task
+    operations: Optional[List[dict]] = None
+    # remove_silence_audio: splice MP3/AAC frames instead of exporting WAV
+    keep_codec: Optional[bool] = False
+    # "low", "medium" or "high" for the output_format's encoder
+    audio_quality: Optional[str] = None
+
+
+class AnalyzeSilenceItem(BaseModel):
+    input_media: str
+    media_type: Optional[str] = "video"
+    silence_threshold: Optional[float] = -36
+    min_silence_duration: Optional[int] = 300
+    padding: Optional[int] = 300
+    remove_background_noise: Optional[bool] = False
+    userId: Optional[str] = None
+    run_locally: Optional[bool] = False
+
+
+class RenderCutsItem(BaseModel):
+    input_media: str
+    nonsilent_ranges: List[List[int]]
+    email: str
+    media_type: Optional[str] = "video"
+    remove_background_noise: Optional[bool] = False
+    userId: Optional[str] = None
+    available_credits: Optional[float] = None
+    run_locally: Optional[bool] = False
+    render_mode: Optional[str] = "moviepy"
+    # Audio only: same output options as /audio-silence/
+    output_format: Optional[str] = "wav"
+    keep_codec: Optional[bool] = False
+    audio_quality: Optional[str] = None
 
 
 class VideoDurationItem(BaseModel):
@@ -156,6 +205,11 @@ async def remove_silence_route(
     task_type = item.task_type
     run_bulk = item.run_bulk
     input_video_urls = item.input_video_urls
+    streaming_detection = item.streaming_detection
+    render_mode = item.render_mode
+
+    if streaming_detection and remove_background_noise:
+        raise HTTPException(status_code=400, detail=STREAMING_DENOISE_ERROR)
 
     if input_video_url is None and input_video_urls is None:
         logging.error("Both Video and Video URLs are None.")
@@ -219,6 +273,9 @@ async def remove_silence_route(
                         True,  # run_locally should be True here
                         False,
                         task_type,
+                        streaming_detection,
+                        None,
+                        render_mode,
                     )
                 )
             except Exception as e:
@@ -250,6 +307,9 @@ async def remove_silence_route(
                     run_locally,
                     run_bulk,
                     task_type,
+                    streaming_detection,
+                    None,
+                    render_mode,
                 )
             )
         except Exception as e:
@@ -296,6 +356,26 @@ async def audio_silence_removal(
     background_audio_url = item.background_audio_url
     gain_during_overlay = item.gain_during_overlay
     run_bulk = item.run_bulk
+    streaming_detection = item.streaming_detection
+    operations = item.operations
+    keep_codec = item.keep_codec
+    audio_quality = item.audio_quality
+
+    if streaming_detection and remove_background_noise:
+        raise HTTPException(status_code=400, detail=STREAMING_DENOISE_ERROR)
+
+    if audio_quality is not None:
+        try:
+            validate_audio_quality(audio_quality)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if operations:
+        task_type = "audio_pipeline"
+        try:
+            validate_operations(operations)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     if input_audio_url is None and input_audio_urls is None:
         logging.error("Both input_audio_url and input_audio_urls are None.")
@@ -313,7 +393,10 @@ async def audio_silence_removal(
     else:
         duration = get_media_duration(input_audio_url)
 
-    cost = calculate_cost(duration, task_type=task_type)
+    if operations:
+        cost = calculate_pipeline_cost(duration, operations)
+    else:
+        cost = calculate_cost(duration, task_type=task_type)
 
     if available_credits < cost:
         return {
@@ -352,6 +435,11 @@ async def audio_silence_removal(
                 background_audio_url,
                 gain_during_overlay,
                 run_bulk,
+                streaming_detection,
+                None,
+                operations,
+                keep_codec,
+                audio_quality,
             )
         )
     except Exception as e:
@@ -372,3 +460,166 @@ async def audio_silence_removal(
         "audio_duration": duration,
         "cost": cost,
     }
+
+
+@app.get("/input-cache-stats/")
+def input_cache_stats_route(authorization: str = Depends(verify_authorization_key)):
+    """
+    Hit/miss counters and size of every reachable worker's input cache,
+    keyed by worker name, for tuning INPUT_CACHE_MAX_BYTES.
+    """
+    replies = celery_app.control.broadcast("input_cache", reply=True, timeout=2)
+    return {
+        "status_code": "SUCCESS",
+        "workers": {
+            worker: stats for reply in replies for worker, stats in reply.items()
+        },
+    }
+
+
+@app.post("/analyze-silence/")
+async def analyze_silence_route(
+    item: AnalyzeSilenceItem, authorization: str = Depends(verify_authorization_key)
+):
+    unique_uuid = str(uuid4())
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # Download and decode on the bounded analysis pool, off the event loop
+        analysis = await asyncio.get_running_loop().run_in_executor(
+            analysis_executor,
+            partial(
+                analyze_silence,
+                temp_dir,
+                item.input_media,
+                unique_uuid,
+                media_type=item.media_type,
+                silence_threshold=item.silence_threshold,
+                min_silence_duration=item.min_silence_duration,
+                padding=item.padding,
+                remove_background_noise=item.remove_background_noise,
+                run_locally=item.run_locally,
+            ),
+        )
+    except Exception as e:
+        logging.error(f"Failed to analyse media. Error: {str(e)}")
+        error_response = {
+            "status": "Error",
+            "error_message": str(e),
+            "status_code": "ERROR",
+        }
+        if item.userId:
+            error_response["uploaded_by"] = item.userId
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_response,
+        )
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+
+    response = {
+        "status": "Silence analysis completed.",
+        "status_code": "SUCCESS",
+        "request_id": unique_uuid,
+        **analysis,
+    }
+    if item.userId:
+        response["uploaded_by"] = item.userId
+
+    return response
+
+
+@app.post("/render-cuts/")
+async def render_cuts_route(
+    item: RenderCutsItem, authorization: str = Depends(verify_authorization_key)
+):
+    if item.media_type not in ("video", "audio"):
+        raise HTTPException(
+            status_code=400, detail="media_type must be 'video' or 'audio'."
+        )
+
+    task_type = (
+        "remove_silence_video" if item.media_type == "video" else "remove_silence_audio"
+    )
+    duration = None
+    cost = 0
+
+    if not item.run_locally:
+        duration = get_media_duration(item.input_media)
+        cost = calculate_cost(duration, task_type=task_type)
+
+        if item.available_credits is None or item.available_credits < cost:
+            raise HTTPException(
+                status_code=403,
+                detail={
+                    "status": "Failed to initiate rendering.",
+                    "error_message": "Insufficient credits for the media duration.",
+                    "media_duration": duration,
+                    "cost": cost,
+                },
+            )
+
+    try:
+        if item.audio_quality is not None:
+            validate_audio_quality(item.audio_quality)
+        nonsilent_ranges = validate_cut_list(
+            item.nonsilent_ranges,
+            int(duration * 1000) if duration is not None else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    unique_uuid = str(uuid4())
+    temp_dir = tempfile.mkdtemp()
+
+    # The supplied cut list goes straight to the render stage, so no
+    # detection settings are passed.
+    task_kwargs = dict(
+        temp_dir=temp_dir,
+        email=item.email,
+        unique_uuid=unique_uuid,
+        padding=0,
+        userId=item.userId,
+        remove_background_noise=item.remove_background_noise,
+        run_locally=item.run_locally,
+        task_type=task_type,
+        nonsilent_ranges=nonsilent_ranges,
+    )
+
+    try:
+        if item.media_type == "video":
+            process_video.apply_async(
+                kwargs=dict(
+                    task_kwargs,
+                    input_video_url=item.input_media,
+                    input_video_urls=None,
+                    render_mode=item.render_mode,
+                )
+            )
+        else:
+            process_audio.apply_async(
+                kwargs=dict(
+                    task_kwargs,
+                    input_audio_url=item.input_media,
+                    input_audio_urls=None,
+                    output_format=item.output_format,
+                    keep_codec=item.keep_codec,
+                    audio_quality=item.audio_quality,
+                )
+            )
+    except Exception as e:
+        logging.error(f"Failed to initiate rendering. Error: {str(e)}")
+        trigger_webhook(unique_uuid, None, None, error_message=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+
+    return {
+        "status": "Rendering started. You will be notified by email once it's done.",
+        "request_id": unique_uuid,
+        "media_duration": duration or 0,
+        "cost": cost,
+    }
@@ -1,6 +1,3 @@
-import math
-from pydub import AudioSegment
-from pydub.silence import detect_silence
 import logging
 import os
 from file_operations import *
@@ -8,11 +5,65 @@ import shutil
 from dotenv import load_dotenv
 from s3_operations import upload_to_s3
 from utils.safeprocess import safe_process
+from utils.audio_encoding import output_extension
 from utils.metrics import compute_audio_metrics
+from utils.ducking import (
+    DUCK_ATTACK_MS,
+    DUCK_RELEASE_MS,
+    duck_gain_curve,
+    mix_ducked,
+)
+from utils.audio_buffer import AudioBuffer
+from utils.silence_detector import (
+    compute_energy_envelope,
+    detect_nonsilent_ranges,
+    iter_nonsilent_ranges,
+)
 
 # Load the environment variables
 load_dotenv()
 
+# Where the main track counts as silent, so the background is not ducked
+DUCK_SILENCE_THRESHOLD = -50
+DUCK_SILENCE_DURATION = 1000  # ms
+
+
+def duck_samples(
+    main_samples,
+    background_samples,
+    frame_rate,
+    gain_during_overlay=-10,
+    attack_ms=DUCK_ATTACK_MS,
+    release_ms=DUCK_RELEASE_MS,
+    non_silent_sections=None,
+):
+    """
+    Mixes `background_samples` (tiled) under `main_samples`, ducked wherever
+    the main track is not silent. Both are (frames, channels) int16 at
+    `frame_rate`; returns the int16 mix.
+    """
+    # Set the initial volume of the background audio
+    background_volume = -20
+
+    if non_silent_sections is None:
+        envelope = compute_energy_envelope(main_samples, frame_rate, 32768)
+        non_silent_sections = detect_nonsilent_ranges(
+            envelope, DUCK_SILENCE_DURATION, DUCK_SILENCE_THRESHOLD
+        )
+
+    # One gain curve for the whole background, then a single multiply-add
+    # over the (tiled) background, however many sections there are.
+    gain = duck_gain_curve(
+        non_silent_sections,
+        len(main_samples),
+        frame_rate,
+        background_gain_db=background_volume,
+        duck_gain_db=gain_during_overlay,
+        attack_ms=attack_ms,
+        release_ms=release_ms,
+    )
+    return mix_ducked(main_samples, background_samples, gain)
+
 
 @safe_process
 def duck_audio(
@@ -24,6 +75,10 @@ def duck_audio(
     output_format="wav",
     userId=None,
     run_bulk=False,
+    streaming_detection=False,
+    attack_ms=DUCK_ATTACK_MS,
+    release_ms=DUCK_RELEASE_MS,
+    audio_quality=None,
 ):
     try:
         logging.info(f"[AUDIO_DUCK_FUNCTION_STARTED]: {unique_uuid}.")
@@ -50,66 +105,50 @@ def duck_audio(
         background_audio_local_path = os.path.join(temp_dir, background_audio_name)
         download_file(background_audio_url, background_audio_local_path)
 
-        main_audio = AudioSegment.from_file(input_audio_local_path)
-        background_audio = AudioSegment.from_file(background_audio_local_path)
-
-        # Repeat the background audio if it's shorter than the main audio
-        if len(background_audio) < len(main_audio):
-            background_audio *= math.ceil(len(main_audio) / len(background_audio))
-        # Trim the background audio if it's longer than the main audio
-        background_audio = background_audio[: len(main_audio)]
-
-        # Set the initial volume of the background audio
-        background_volume = -20
-        background_audio = background_audio + background_volume
-
-        # Find the sections where the main audio is silent
-        silence_threshold = -50  # Adjust this value as needed
-        silence_duration = 1000  # Adjust this value as needed (in milliseconds)
-        silent_sections = detect_silence(
-            main_audio,
-            min_silence_len=silence_duration,
-            silence_thresh=silence_threshold,
-            seek_step=1,  # Adjust this value as needed for performance
+        # Decode both tracks as they are, then bring them to one format
+        main_audio, background_audio = AudioBuffer.from_files(
+            [input_audio_local_path, background_audio_local_path]
         )
 
-        # Invert the silent sections to find the non-silent sections
-        non_silent_sections = []
-        start = 0
-        for silence_start, silence_end in silent_sections:
-            if start < silence_start:
-                non_silent_sections.append((start, silence_start))
-            start = silence_end
-        if start < len(main_audio):
-            non_silent_sections.append((start, len(main_audio)))
-
-        # Create a copy of the background audio for ducking
-        ducked_background = background_audio
-
-        # Iterate over the non-silent sections and apply ducking to the background audio
-        for start, end in non_silent_sections:
-            ducked_background = ducked_background.overlay(
-                main_audio[start:end],
-                position=start,
-                gain_during_overlay=gain_during_ducking,
+        # Find the sections where the main audio is not silent
+        non_silent_sections = None
+        if streaming_detection:
+            # Same sections, read from an ffmpeg pipe in fixed-size chunks
+            non_silent_sections = list(
+                iter_nonsilent_ranges(
+                    input_audio_local_path,
+                    DUCK_SILENCE_DURATION,
+                    DUCK_SILENCE_THRESHOLD,
+                )
             )
 
-        # Overlay the ducked background audio onto the main audio
-        ducked_audio = main_audio.overlay(ducked_background)
+        ducked_samples = duck_samples(
+            main_audio.samples,
+            background_audio.samples,
+            main_audio.frame_rate,
+            gain_during_ducking,
+            attack_ms,
+            release_ms,
+            non_silent_sections,
+        )
 
         output_audio_local_path = os.path.join(
-            temp_dir, f"output_{unique_uuid}.{output_format}"
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
+        )
+        AudioBuffer(ducked_samples, main_audio.frame_rate).export(
+            output_audio_local_path, output_format, audio_quality
         )
-        ducked_audio.export(output_audio_local_path, format=output_format)
 
         logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
 
-        output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+        output_audio_s3_path = f"{unique_uuid}_output.{output_extension(output_format)}"
 
         if run_bulk:
             file_path = output_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
             presignedUrl = upload_to_s3(
                 output_audio_local_path, output_audio_s3_path, userId
             )
@@ -1,5 +1,4 @@
 import math
-from pydub import AudioSegment
 import logging
 import os
 from file_operations import *
@@ -7,7 +6,10 @@ import shutil
 from dotenv import load_dotenv
 from s3_operations import upload_to_s3
 from utils.safeprocess import safe_process
+from utils.audio_encoding import output_extension
 from utils.metrics import compute_audio_metrics
+from utils.audio_buffer import AudioBuffer
+from utils.pcm_stream import pcm_encoder
 
 # Load the environment variables
 load_dotenv()
@@ -23,6 +25,7 @@ def loop_audio(
     output_format="wav",
     userId=None,
     run_bulk=False,
+    audio_quality=None,
 ):
     try:
         logging.info(f"[AUDIO_LOOP_FUNCTION_STARTED]: {unique_uuid}.")
@@ -37,32 +40,49 @@ def loop_audio(
         input_audio_local_path = os.path.join(temp_dir, original_name)
         download_file(input_audio_url, input_audio_local_path)
 
-        audio_segment = AudioSegment.from_file(input_audio_local_path)
+        # Decode the source loop once; the output is never held in memory
+        source_audio = AudioBuffer.from_file(input_audio_local_path)
+        source, frame_rate = source_audio.samples, source_audio.frame_rate
 
-        original_duration = len(audio_segment) / 1000  # pydub works in milliseconds
+        original_duration = len(source) / frame_rate
+
+        if not len(source):
+            raise ValueError("The audio file is empty.")
 
         if loop_count:
-            looped_audio = audio_segment * loop_count
+            total_frames = len(source) * loop_count
         elif loop_duration:
             loop_count = math.ceil(loop_duration / original_duration)
-            looped_audio = audio_segment * loop_count
+            total_frames = int(round(loop_duration * frame_rate))
         else:
             raise ValueError("Either loop_count or loop_duration must be provided.")
 
         output_audio_local_path = os.path.join(
-            temp_dir, f"output_{unique_uuid}.{output_format}"
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
         )
 
-        looped_audio.export(output_audio_local_path, format=output_format)
+        # Feed the same buffer to the encoder again and again, cutting the
+        # last pass so the output is exactly total_frames long.
+        with pcm_encoder(
+            output_audio_local_path,
+            frame_rate,
+            source_audio.channels,
+            output_format,
+            audio_quality,
+        ) as write:
+            for start in range(0, total_frames, len(source)):
+                write(source[: total_frames - start])
 
         logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
 
-        output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+        output_audio_s3_path = f"{unique_uuid}_output.{output_extension(output_format)}"
 
         if run_bulk:
             file_path = output_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
             presignedUrl = upload_to_s3(
                 output_audio_local_path, output_audio_s3_path, userId
             )
@@ -77,7 +97,7 @@ def loop_audio(
         metrics = {
             "original_duration": original_duration,
             "loop_count": loop_count,
-            "final_duration": original_duration * loop_count,
+            "final_duration": total_frames / frame_rate,
         }
 
         return file_path, unique_uuid, metrics
@@ -1,16 +1,20 @@
 import os
-from pydub import AudioSegment
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import shutil
 from dotenv import load_dotenv
 from s3_operations import upload_to_s3
 from utils.safeprocess import safe_process
 from utils.metrics import compute_audio_metrics
+from utils.audio_concat import concat_audio_files
+from utils.audio_encoding import output_extension
 from file_operations import *
 
 # Load the environment variables
 load_dotenv()
 
+MERGE_DOWNLOAD_WORKERS = int(os.environ.get("MERGE_DOWNLOAD_WORKERS", 8))
+
 
 @safe_process
 def merge_audio_files(
@@ -20,13 +24,12 @@ def merge_audio_files(
     output_format="wav",
     userId=None,
     run_bulk=False,
+    audio_quality=None,
 ):
     try:
         logging.info(f"[AUDIO_MERGE_FUNCTION_STARTED]: {unique_uuid}.")
 
-        # Initialize an empty AudioSegment
-        merged_audio = AudioSegment.empty()
-
+        input_audio_local_paths = []
         for index, input_audio_url in enumerate(input_audio_urls):
             original_name = os.path.basename(input_audio_url.split("?")[0])
             original_name = sanitize_filename(original_name)
@@ -35,28 +38,36 @@ def merge_audio_files(
             if not file_extension:
                 original_name += ".wav"
 
-            input_audio_local_path = os.path.join(
-                temp_dir, f"input_{index}_{original_name}"
+            input_audio_local_paths.append(
+                os.path.join(temp_dir, f"input_{index}_{original_name}")
             )
-            download_file(input_audio_url, input_audio_local_path)
 
-            audio_segment = AudioSegment.from_file(input_audio_local_path)
-            merged_audio += audio_segment
+        # Fetch every input at once instead of one after another
+        with ThreadPoolExecutor(max_workers=MERGE_DOWNLOAD_WORKERS) as executor:
+            list(executor.map(download_file, input_audio_urls, input_audio_local_paths))
 
         output_audio_local_path = os.path.join(
-            temp_dir, f"output_{unique_uuid}.{output_format}"
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
         )
 
-        merged_audio.export(output_audio_local_path, format=output_format)
+        # Stream copy when the inputs allow it, else one decode -> encode pipe
+        concat_audio_files(
+            input_audio_local_paths,
+            output_audio_local_path,
+            output_format,
+            audio_quality,
+        )
 
         logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
 
-        output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+        output_audio_s3_path = f"{unique_uuid}_output.{output_extension(output_format)}"
 
         if run_bulk:
             file_path = output_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
             presignedUrl = upload_to_s3(
                 output_audio_local_path, output_audio_s3_path, userId
             )
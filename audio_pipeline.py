@@ -0,0 +1,147 @@
+import logging
+import os
+from file_operations import *
+from dotenv import load_dotenv
+from s3_operations import upload_to_s3
+from utils.safeprocess import safe_process
+from utils.audio_encoding import output_extension
+from utils.metrics import compute_audio_metrics
+from utils.audio_buffer import AudioBuffer
+from utils.time_stretch import stretch_samples
+from background_noise import spectral_subtraction
+from audio_silence import remove_silence_samples
+from audio_duck import duck_samples
+
+# Load the environment variables
+load_dotenv()
+
+# Operations a pipeline can chain, named after the task types they replace
+PIPELINE_OPERATIONS = (
+    "remove_noise_audio",
+    "remove_silence_audio",
+    "audio_speed",
+    "audio_duck",
+)
+
+
+def validate_operations(operations):
+    if not operations:
+        raise ValueError("An audio pipeline needs at least one operation.")
+    for operation in operations:
+        task_type = operation.get("task_type")
+        if task_type not in PIPELINE_OPERATIONS:
+            raise ValueError(f"Invalid pipeline operation: {task_type}")
+        if task_type == "audio_duck" and not operation.get("background_audio_url"):
+            raise ValueError("audio_duck needs a background_audio_url.")
+
+
+def download_input(temp_dir, url, prefix):
+    name = sanitize_filename(os.path.basename(url.split("?")[0]))
+    _, file_extension = os.path.splitext(name)
+    if not file_extension:
+        name += ".wav"
+
+    local_path = os.path.join(temp_dir, f"{prefix}_{name}")
+    download_file(url, local_path)
+    return local_path
+
+
+@safe_process
+def run_audio_pipeline(
+    temp_dir,
+    input_audio_url,
+    unique_uuid,
+    operations,
+    output_format="wav",
+    userId=None,
+    run_bulk=False,
+    audio_quality=None,
+):
+    """
+    Runs `operations` (dicts with a `task_type` from PIPELINE_OPERATIONS and
+    that task's parameters) in order over one decoded copy of the input.
+    PCM buffers pass straight from stage to stage; the result is encoded
+    and uploaded once.
+    """
+    try:
+        logging.info(f"[AUDIO_PIPELINE_STARTED]: {unique_uuid}.")
+        validate_operations(operations)
+
+        input_audio_local_path = download_input(temp_dir, input_audio_url, "input")
+
+        audio_buffer = AudioBuffer.from_file(input_audio_local_path)
+        samples, frame_rate = audio_buffer.samples, audio_buffer.frame_rate
+        channels = audio_buffer.channels
+        original_duration = audio_buffer.duration
+
+        metrics = {"original_duration": original_duration}
+
+        for index, operation in enumerate(operations):
+            task_type = operation["task_type"]
+            logging.info(f"[AUDIO_PIPELINE_STAGE]: {unique_uuid} #{index} {task_type}")
+
+            if task_type == "remove_noise_audio":
+                samples = spectral_subtraction(
+                    samples,
+                    frame_rate,
+                    operation.get("noise_duration") or 0.5,
+                    operation.get("amplification_factor") or 1.9,
+                )
+            elif task_type == "remove_silence_audio":
+                stage_duration = len(samples) / frame_rate
+                samples, nonsilent_ranges = remove_silence_samples(
+                    samples,
+                    frame_rate,
+                    operation.get("silence_threshold", -50),
+                    operation.get("min_silence_duration", 300),
+                    operation.get("padding", 100),
+                )
+                metrics[task_type] = compute_audio_metrics(
+                    stage_duration, nonsilent_ranges
+                )
+            elif task_type == "audio_speed":
+                speed_factor = operation.get("speed_factor", 1.0)
+                if speed_factor != 1.0:
+                    samples = stretch_samples(samples, frame_rate, speed_factor)
+            elif task_type == "audio_duck":
+                background_audio_local_path = download_input(
+                    temp_dir, operation["background_audio_url"], f"background_{index}"
+                )
+                background_audio = AudioBuffer.from_file(
+                    background_audio_local_path
+                ).convert(frame_rate, channels)
+                samples = duck_samples(
+                    samples,
+                    background_audio.samples,
+                    frame_rate,
+                    operation.get("gain_during_overlay", -10),
+                )
+
+        output_audio_local_path = os.path.join(
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
+        )
+        AudioBuffer(samples, frame_rate).export(
+            output_audio_local_path, output_format, audio_quality
+        )
+
+        logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
+
+        if run_bulk:
+            file_path = output_audio_local_path
+        else:
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
+            file_path = upload_to_s3(
+                output_audio_local_path, output_audio_s3_path, userId
+            )
+
+        logging.info(f"[AUDIO_UPLOADED]: {unique_uuid}.")
+
+        metrics["final_duration"] = len(samples) / frame_rate
+
+        return file_path, unique_uuid, metrics
+
+    except Exception as e:
+        logging.error(f"Error processing audio {input_audio_url}. Error: {str(e)}")
+        raise
@@ -8,6 +8,8 @@ from bg_noise_removal import *
 from ai_music_generation import *
 from audio_speed import *
 from audio_duck import *
+from audio_pipeline import run_audio_pipeline
+from utils.silence_detector import candidate_thresholds
 import zipfile
 
 from uuid import uuid4
@@ -46,6 +48,11 @@ def process_audio(
     background_audio_url=None,
     gain_during_overlay=-10,
     run_bulk=False,
+    streaming_detection=False,
+    nonsilent_ranges=None,
+    operations=None,
+    keep_codec=False,
+    audio_quality=None,
 ):
     logging.info(
         f"[AUDIO_PROCESSING_STARTING]: {input_audio_url}, {unique_uuid}. [USER]: {userId}"
@@ -65,6 +72,9 @@ def process_audio(
             threshold_increment = -5
             error_message = None
             job_id = str(uuid4())
+            threshold_candidates = candidate_thresholds(
+                silence_threshold, threshold_increment, max_attempts
+            )
 
             while attempts < max_attempts:
                 try:
@@ -76,6 +86,7 @@ def process_audio(
                             loop_count=loop_count,
                             loop_duration=loop_duration,
                             output_format=output_format,
+                            audio_quality=audio_quality,
                             userId=userId,
                             run_bulk=True,
                         )
@@ -90,6 +101,11 @@ def process_audio(
                             userId,
                             remove_background_noise,
                             run_bulk=True,
+                            threshold_candidates=threshold_candidates,
+                            streaming_detection=streaming_detection,
+                            keep_codec=keep_codec,
+                            output_format=output_format,
+                            audio_quality=audio_quality,
                         )
                     elif task_type == "audio_merge":
                         local_path, _, metrics = merge_audio_files(
@@ -99,6 +115,7 @@ def process_audio(
                             ],  # Pass input_audio_url as a single-item list
                             job_id,
                             output_format=output_format,
+                            audio_quality=audio_quality,
                             userId=userId,
                             run_bulk=True,
                         )
@@ -109,8 +126,10 @@ def process_audio(
                             job_id,
                             noise_duration,
                             amplification_factor,
-                            userId,
+                            output_format=output_format,
+                            userId=userId,
                             run_bulk=True,
+                            audio_quality=audio_quality,
                         )
                     elif task_type == "ai_music_generation":
                         local_path, _, metrics = generate_music(
@@ -129,6 +148,7 @@ def process_audio(
                             job_id,
                             speed_factor=speed_factor,
                             output_format=output_format,
+                            audio_quality=audio_quality,
                             userId=userId,
                             run_bulk=True,
                         )
@@ -140,6 +160,19 @@ def process_audio(
                             background_audio_url,
                             gain_during_overlay=gain_during_overlay,
                             output_format=output_format,
+                            audio_quality=audio_quality,
+                            userId=userId,
+                            run_bulk=True,
+                            streaming_detection=streaming_detection,
+                        )
+                    elif task_type == "audio_pipeline":
+                        local_path, _, metrics = run_audio_pipeline(
+                            temp_dir,
+                            input_audio_url,
+                            job_id,
+                            operations,
+                            output_format=output_format,
+                            audio_quality=audio_quality,
                             userId=userId,
                             run_bulk=True,
                         )
@@ -156,17 +189,12 @@ def process_audio(
                     logging.error(
                         f"Attempt {attempts + 1} failed for {input_audio_url}. Error: {str(e)}"
                     )
-                    if str(e) == "nonsilent_ranges is None or empty.":
-                        attempts += 1
-                        silence_threshold += threshold_increment
-                        logging.warning(
-                            f"Adjusting silence threshold to {silence_threshold}. Attempt {attempts}/{max_attempts}."
-                        )
-                    else:
-                        error_messages.append(
-                            f"Error processing {input_audio_url}: {str(e)}"
-                        )
-                        break
+                    # remove_silence_audio already tried every candidate
+                    # threshold, so a retry would only repeat the same work.
+                    error_messages.append(
+                        f"Error processing {input_audio_url}: {str(e)}"
+                    )
+                    break
 
         if output_files:
             zip_file_name = f"{unique_uuid}_processed_audio_files.zip"
@@ -207,6 +235,9 @@ def process_audio(
         max_attempts = 3
         threshold_increment = -5
         error_message = None
+        threshold_candidates = candidate_thresholds(
+            silence_threshold, threshold_increment, max_attempts
+        )
 
         while attempts < max_attempts:
             try:
@@ -218,6 +249,7 @@ def process_audio(
                         loop_count=loop_count,
                         loop_duration=loop_duration,
                         output_format=output_format,
+                        audio_quality=audio_quality,
                         userId=userId,
                     )
                 elif task_type == "remove_silence_audio":
@@ -230,6 +262,12 @@ def process_audio(
                         padding,
                         userId,
                         remove_background_noise,
+                        threshold_candidates=threshold_candidates,
+                        streaming_detection=streaming_detection,
+                        nonsilent_ranges=nonsilent_ranges,
+                        keep_codec=keep_codec,
+                        output_format=output_format,
+                        audio_quality=audio_quality,
                     )
                 elif task_type == "audio_merge":
                     output_audio_s3_url, _, metrics = merge_audio_files(
@@ -237,6 +275,7 @@ def process_audio(
                         input_audio_urls,
                         unique_uuid,
                         output_format=output_format,
+                        audio_quality=audio_quality,
                         userId=userId,
                     )
                 elif task_type == "remove_noise_audio":
@@ -247,7 +286,9 @@ def process_audio(
                             unique_uuid,
                             noise_duration,
                             amplification_factor,
-                            userId,
+                            output_format=output_format,
+                            userId=userId,
+                            audio_quality=audio_quality,
                         )
                     )
                 elif task_type == "ai_music_generation":
@@ -266,6 +307,7 @@ def process_audio(
                         unique_uuid,
                         speed_factor=speed_factor,
                         output_format=output_format,
+                        audio_quality=audio_quality,
                         userId=userId,
                     )
                 elif task_type == "audio_duck":
@@ -276,6 +318,18 @@ def process_audio(
                         background_audio_url,
                         gain_during_overlay=gain_during_overlay,
                         output_format=output_format,
+                        audio_quality=audio_quality,
+                        userId=userId,
+                        streaming_detection=streaming_detection,
+                    )
+                elif task_type == "audio_pipeline":
+                    output_audio_s3_url, _, metrics = run_audio_pipeline(
+                        temp_dir,
+                        input_audio_url,
+                        unique_uuid,
+                        operations,
+                        output_format=output_format,
+                        audio_quality=audio_quality,
                         userId=userId,
                     )
                 else:
@@ -288,15 +342,10 @@ def process_audio(
 
             except Exception as e:
                 logging.error(f"Attempt {attempts + 1} failed. Error: {str(e)}")
-                if str(e) == "nonsilent_ranges is None or empty.":
-                    attempts += 1
-                    silence_threshold += threshold_increment
-                    logging.warning(
-                        f"Adjusting silence threshold to {silence_threshold}. Attempt {attempts}/{max_attempts}."
-                    )
-                else:
-                    error_message = str(e)
-                    break
+                # remove_silence_audio already tried every candidate
+                # threshold, so a retry would only repeat the same work.
+                error_message = str(e)
+                break
 
             finally:
                 if os.path.exists(temp_dir):
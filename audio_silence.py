@@ -1,18 +1,35 @@
-from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 import logging
 import os
 from file_operations import *
-import shutil
+import subprocess
 from dotenv import load_dotenv
 from s3_operations import upload_to_s3
 from utils.safeprocess import safe_process
 
 # from utils.safeprocess import safe_process
+from utils.silence_detector import (
+    STREAMING_DENOISE_ERROR,
+    candidate_thresholds,
+    choose_cut_list,
+    compute_energy_envelope,
+    detect_nonsilent_streaming,
+    merge_ranges,
+    select_nonsilent_ranges,
+)
+from utils.audio_buffer import AudioBuffer
+from utils.audio_cut import (
+    can_cut_compressed,
+    compressed_cut_extension,
+    cut_compressed,
+)
+from utils.audio_encoding import encoder_args, output_extension
+from utils.media_info import probe_media
+from utils.envelope_cache import cached_pcm_envelope, envelope_cache_key
 from utils.metrics import compute_audio_metrics
-from utils.detect_silence_threshold import compute_silence_threshold
+from file_duration import get_media_duration
+from utils.detect_silence_threshold import adaptive_silence_thresholds
 
-from background_noise import denoise_audio_spectral_subtraction
+from background_noise import spectral_subtraction
 
 # from background_noise import clean_background_noise
 
@@ -20,6 +37,75 @@ from background_noise import denoise_audio_spectral_subtraction
 load_dotenv()
 
 
+def cut_audio_with_ffmpeg(
+    input_path, nonsilent_ranges, output_path, output_format="wav", quality=None
+):
+    """
+    Keeps only `nonsilent_ranges` of `input_path` using a single streaming
+    ffmpeg aselect pass, encoding straight to `output_format`. The selection
+    goes through a filter script because long inputs produce thousands of
+    ranges.
+    """
+    expression = "+".join(
+        f"between(t,{start / 1000:.3f},{end / 1000:.3f})"
+        for start, end in nonsilent_ranges
+    )
+    filter_script_path = f"{output_path}.filter"
+    with open(filter_script_path, "w") as f:
+        f.write(f"aselect='{expression}',asetpts=N/SR/TB")
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        input_path,
+        "-vn",
+        "-filter_script:a",
+        filter_script_path,
+        *encoder_args(output_format, quality),
+        output_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    finally:
+        os.remove(filter_script_path)
+
+    logging.info(f"[AUDIO_CUT_WITH_FFMPEG]: {len(nonsilent_ranges)} ranges")
+
+
+def remove_silence_samples(
+    samples, frame_rate, silence_threshold=-50, min_silence_duration=300, padding=100
+):
+    """
+    In-memory remove_silence_audio for (frames, channels) int16 samples: picks
+    the cut list from their envelope with the same candidate thresholds
+    process_audio gives the standalone task (the requested one, the adaptive
+    ones, then the -5/-10 dB fallbacks) and returns
+    `(kept_samples, nonsilent_ranges)`.
+    """
+    envelope = compute_energy_envelope(samples, frame_rate, 32768)
+    thresholds = candidate_thresholds(silence_threshold, -5, 3)
+    adaptive_thresholds = adaptive_silence_thresholds(envelope)
+    thresholds[1:1] = adaptive_thresholds
+
+    silence_threshold, nonsilent_ranges = select_nonsilent_ranges(
+        envelope,
+        thresholds,
+        min_silence_duration,
+        padding,
+        max_kept_ratio=0.85,
+        fallback_threshold=adaptive_thresholds[0],
+    )
+    logging.info(f"silence_threshold: {silence_threshold}")
+
+    kept = AudioBuffer(samples, frame_rate).gather(
+        merge_ranges(nonsilent_ranges, len(envelope))
+    )
+    return kept.samples, nonsilent_ranges
+
+
 @safe_process
 def remove_silence_audio(
     temp_dir,
@@ -31,6 +117,12 @@ def remove_silence_audio(
     userId=None,
     remove_background_noise=False,
     run_bulk=False,
+    threshold_candidates=None,
+    streaming_detection=False,
+    nonsilent_ranges=None,
+    keep_codec=False,
+    output_format="wav",
+    audio_quality=None,
 ):
     try:
         logging.info(f"[AUDIO_REMOVE_SILENCE_FUNCTION_STARTED]: {unique_uuid}.")
@@ -41,6 +133,8 @@ def remove_silence_audio(
             min_silence_duration = 300
         if padding is None:
             padding = 100
+        if streaming_detection and remove_background_noise:
+            raise ValueError(STREAMING_DENOISE_ERROR)
 
         original_name = os.path.basename(input_audio_url.split("?")[0])
         original_name = sanitize_filename(original_name)
@@ -52,66 +146,143 @@ def remove_silence_audio(
         input_audio_local_path = os.path.join(temp_dir, original_name)
         download_file(input_audio_url, input_audio_local_path)
 
-        converted_audio_path = os.path.join(temp_dir, "converted_to_wav.wav")
-        audio_segment = AudioSegment.from_file(input_audio_local_path)
-        audio_segment.export(converted_audio_path, format="wav")
+        # MP3/AAC inputs can keep their codec: detection still runs on PCM,
+        # but the output is spliced from the original frames. Denoised audio
+        # has to be re-encoded, so it goes out as output_format instead.
+        output_format = output_format or "wav"
+        media_info = None
+        extension = output_extension(output_format)
+        if keep_codec and not remove_background_noise:
+            media_info = probe_media(input_audio_local_path)
+            if can_cut_compressed(media_info):
+                extension = compressed_cut_extension(media_info)
+            else:
+                media_info = None
 
-        # # If remove_background_noise is True, process the audio to remove noise
-        if remove_background_noise:
-            denoised_audio_file = denoise_audio_spectral_subtraction(
-                converted_audio_path
-            )
-            audio_segment = AudioSegment.from_file(denoised_audio_file)
+        output_audio_local_path = os.path.join(
+            temp_dir, f"output_{unique_uuid}.{extension}"
+        )
 
-        else:
-            audio_segment = AudioSegment.from_file(input_audio_local_path)
+        thresholds = list(threshold_candidates or [silence_threshold])
 
-        loop_counter = 0
+        if streaming_detection:
+            # Detect and cut through ffmpeg pipes so the decoded track never
+            # has to fit in memory. The mean-volume candidate needs a full
+            # pass of its own, so only the requested thresholds are tried.
+            if nonsilent_ranges is None:
+                candidates, duration_ms = detect_nonsilent_streaming(
+                    input_audio_local_path, thresholds, min_silence_duration
+                )
+                silence_threshold, nonsilent_ranges = choose_cut_list(
+                    candidates, duration_ms, padding, max_kept_ratio=0.85
+                )
+            else:
+                duration_ms = int(get_media_duration(input_audio_local_path) * 1000)
 
-        while loop_counter < 2:
-            nonsilent_ranges = detect_nonsilent(
-                audio_segment,
-                min_silence_len=min_silence_duration,
-                silence_thresh=silence_threshold,
-            )
+            logging.info(f"silence_threshold: {silence_threshold}")
+
+            if media_info:
+                cut_compressed(
+                    input_audio_local_path,
+                    merge_ranges(nonsilent_ranges, duration_ms),
+                    output_audio_local_path,
+                    media_info,
+                )
+            else:
+                cut_audio_with_ffmpeg(
+                    input_audio_local_path,
+                    merge_ranges(nonsilent_ranges, duration_ms),
+                    output_audio_local_path,
+                    output_format,
+                    audio_quality,
+                )
 
-            nonsilent_ranges = [
-                (start - padding, end + padding) for start, end in nonsilent_ranges
-            ]
+            original_duration = duration_ms / 1000
 
-            logging.info(f"[NON_SILENT_RANGES_CONCATENATED]: {unique_uuid}.")
+        else:
+            decoded = []
+
+            def load_audio():
+                # Decoded (and denoised) on first use only: a cached envelope
+                # rendered by splicing compressed frames never needs the PCM
+                if not decoded:
+                    audio_buffer = AudioBuffer.from_file(input_audio_local_path)
+                    if remove_background_noise:
+                        audio_buffer = AudioBuffer(
+                            spectral_subtraction(
+                                audio_buffer.samples, audio_buffer.frame_rate
+                            ),
+                            audio_buffer.frame_rate,
+                        )
+                    decoded.append(audio_buffer)
+                return decoded[0]
+
+            if nonsilent_ranges is None:
+                # Analyse once and try every candidate threshold against the same
+                # envelope; only the winning cut list gets rendered.
+                envelope_key = envelope_cache_key(
+                    input_audio_local_path,
+                    "audio:denoised" if remove_background_noise else "audio",
+                )
+                envelope = cached_pcm_envelope(
+                    envelope_key,
+                    lambda: (load_audio().samples, load_audio().frame_rate),
+                )
 
-            concatenated_audio = AudioSegment.empty()
-            for start, end in nonsilent_ranges:
-                concatenated_audio += audio_segment[start:end]
+                adaptive_thresholds = adaptive_silence_thresholds(envelope)
+                thresholds[1:1] = adaptive_thresholds
 
-            # Determine durations for comparison
-            original_duration = len(audio_segment) / 1000  # pydub works in milliseconds
-            final_duration = len(concatenated_audio) / 1000
+                silence_threshold, nonsilent_ranges = select_nonsilent_ranges(
+                    envelope,
+                    thresholds,
+                    min_silence_duration,
+                    padding,
+                    max_kept_ratio=0.85,
+                    fallback_threshold=adaptive_thresholds[0],
+                )
 
-            if (
-                original_duration > final_duration
-                and final_duration < 0.85 * original_duration
-            ):
                 logging.info(f"silence_threshold: {silence_threshold}")
-                break
+                # Same rounding as AudioBuffer.duration_ms
+                duration_ms = len(envelope)
+            else:
+                # A cut list from /analyze-silence/ (possibly edited by the
+                # client) is rendered as-is, without any detection.
+                logging.info(
+                    f"[USING_SUPPLIED_CUT_LIST]: {len(nonsilent_ranges)} ranges"
+                )
+                if media_info:
+                    duration_ms = int(get_media_duration(input_audio_local_path) * 1000)
+                else:
+                    duration_ms = load_audio().duration_ms
 
-            silence_threshold = compute_silence_threshold(input_audio_local_path)
-            logging.info(f"silence_threshold: {silence_threshold}")
-            loop_counter += 1
+            original_duration = duration_ms / 1000
+
+            if media_info:
+                cut_compressed(
+                    input_audio_local_path,
+                    merge_ranges(nonsilent_ranges, duration_ms),
+                    output_audio_local_path,
+                    media_info,
+                )
+            else:
+                # One preallocated copy of the kept ranges instead of a growing
+                # concatenation per range
+                concatenated_audio = load_audio().gather(nonsilent_ranges)
 
-        output_audio_local_path = os.path.join(temp_dir, f"output_{unique_uuid}.wav")
+                logging.info(f"[NON_SILENT_RANGES_CONCATENATED]: {unique_uuid}.")
 
-        concatenated_audio.export(output_audio_local_path, format="wav")
+                concatenated_audio.export(
+                    output_audio_local_path, output_format, audio_quality
+                )
 
         logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
 
-        output_audio_s3_path = f"{unique_uuid}_output.wav"
+        output_audio_s3_path = f"{unique_uuid}_output.{extension}"
 
         if run_bulk:
             file_path = output_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.wav"
+            output_audio_s3_path = f"{unique_uuid}_output.{extension}"
             presignedUrl = upload_to_s3(
                 output_audio_local_path, output_audio_s3_path, userId
             )
@@ -1,11 +1,12 @@
 import os
-from pydub import AudioSegment
 import logging
 import shutil
 from dotenv import load_dotenv
 from s3_operations import upload_to_s3
 from utils.safeprocess import safe_process
+from utils.audio_encoding import output_extension
 from utils.metrics import compute_audio_metrics
+from utils.time_stretch import time_stretch
 from file_operations import *
 
 # Load the environment variables
@@ -21,6 +22,7 @@ def change_audio_speed(
     output_format="wav",
     userId=None,
     run_bulk=False,
+    audio_quality=None,
 ):
     try:
         logging.info(f"[AUDIO_SPEED_CHANGE_FUNCTION_STARTED]: {unique_uuid}.")
@@ -35,25 +37,29 @@ def change_audio_speed(
         input_audio_local_path = os.path.join(temp_dir, f"input_{original_name}")
         download_file(input_audio_url, input_audio_local_path)
 
-        audio_segment = AudioSegment.from_file(input_audio_local_path)
-
-        # Change the speed of the audio
-        modified_audio = audio_segment.speedup(playback_speed=speed_factor)
-
         output_audio_local_path = os.path.join(
-            temp_dir, f"output_{unique_uuid}.{output_format}"
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
         )
 
-        modified_audio.export(output_audio_local_path, format=output_format)
+        # Change the speed of the audio, streamed from decoder to encoder
+        time_stretch(
+            input_audio_local_path,
+            output_audio_local_path,
+            speed_factor,
+            output_format,
+            audio_quality,
+        )
 
         logging.info(f"[AUDIO_EXPORTED]: {unique_uuid}.")
 
-        output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+        output_audio_s3_path = f"{unique_uuid}_output.{output_extension(output_format)}"
 
         if run_bulk:
             file_path = output_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
             presignedUrl = upload_to_s3(
                 output_audio_local_path, output_audio_s3_path, userId
             )
@@ -1,6 +1,19 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import scipy.fft
 from scipy.io import wavfile
-from scipy.signal import stft, istft
+from scipy.signal import get_window
+
+# Parameters for STFT
+NPERSEG = 1024
+NOVERLAP = int(NPERSEG * 0.75)
+HOP = NPERSEG - NOVERLAP
+
+# STFT frames per block; each in-flight block holds a few
+# block_frames x NPERSEG float32 arrays
+DENOISE_BLOCK_FRAMES = int(os.environ.get("DENOISE_BLOCK_FRAMES", 2048))
+DENOISE_WORKERS = int(os.environ.get("DENOISE_WORKERS") or os.cpu_count() or 1)
 
 
 def denoise_audio_spectral_subtraction(
@@ -8,38 +21,155 @@ def denoise_audio_spectral_subtraction(
 ):
     # 1. Read in the audio file
     rate, data = wavfile.read(audio_file)
-    if len(data.shape) == 2:  # Stereo
-        data = data.mean(axis=1)
 
-    # Parameters for STFT
-    nperseg = 1024
-    noverlap = int(nperseg * 0.75)
+    cleaned_data = spectral_subtraction(
+        data, rate, noise_duration, amplification_factor
+    )
+
+    # Write out the processed audio
+    cleaned_audio_file = audio_file.replace(".wav", "_spectral_subtracted.wav")
+    wavfile.write(cleaned_audio_file, rate, cleaned_data)
+
+    return cleaned_audio_file
+
 
-    # Perform STFT
-    f, t, Zxx = stft(data, fs=rate, nperseg=nperseg, noverlap=noverlap)
+def _frames(padded, first, count):
+    # Read-only (channels, count, NPERSEG) view of STFT frames first..first+count-1
+    start = first * HOP
+    span = padded[:, start : start + (count - 1) * HOP + NPERSEG]
+    return np.lib.stride_tricks.sliding_window_view(span, NPERSEG, axis=-1)[:, ::HOP]
 
+
+def _noise_profile(padded, noise_frames, window, block_frames):
     # Estimate the noise using the first few frames (assuming they only contain noise)
-    noise_frames = int(noise_duration * rate / (nperseg - noverlap))
-    noise_estimation = np.abs(Zxx[:, :noise_frames]).mean(axis=1).reshape(-1, 1)
+    total = np.zeros((len(padded), 1, NPERSEG // 2 + 1))
+    for first in range(0, noise_frames, block_frames):
+        count = min(block_frames, noise_frames - first)
+        spectra = scipy.fft.rfft(_frames(padded, first, count) * window, axis=-1)
+        total += np.abs(spectra).sum(axis=1, keepdims=True)
+    return (total / max(noise_frames, 1)).astype(np.float32)
 
-    # Subtract the noise estimate from the magnitude spectrum
-    Zxx_magnitude = np.abs(Zxx) - noise_estimation
-    Zxx_magnitude = np.maximum(Zxx_magnitude, 0)  # ensure non-negative values
 
-    # Reconstruct the modified spectrum (keep the original phase)
-    Zxx_denoised = Zxx_magnitude * np.exp(1j * np.angle(Zxx))
+def _denoise_block(padded, first, count, window, noise_estimation):
+    """
+    Denoises STFT frames first..first+count-1 of every channel in one batched
+    transform and returns their windowed, overlap-added samples, starting at
+    padded position first * HOP.
+    """
+    spectra = scipy.fft.rfft(_frames(padded, first, count) * window, axis=-1)
 
-    # Perform inverse STFT
-    _, cleaned_data = istft(Zxx_denoised, fs=rate, nperseg=nperseg, noverlap=noverlap)
+    # Subtracting the noise from the magnitude while keeping the phase is
+    # the same as scaling each bin by a real gain, so no phase is rebuilt.
+    magnitude = np.abs(spectra)
+    gain = np.maximum(magnitude - noise_estimation, 0)
+    np.divide(gain, magnitude, out=gain, where=magnitude > 0)
+    spectra *= gain
 
-    # Adjust the magnitude
-    cleaned_data = cleaned_data * amplification_factor
-    cleaned_data = np.clip(
-        cleaned_data, -32768, 32767
-    )  # Clip to prevent values outside int16 range
+    frames = scipy.fft.irfft(spectra, n=NPERSEG, axis=-1)
+    frames *= window
 
-    # Write out the processed audio
-    cleaned_audio_file = audio_file.replace(".wav", "_spectral_subtracted.wav")
-    wavfile.write(cleaned_audio_file, rate, cleaned_data.astype(np.int16))
+    # Frames NPERSEG // HOP apart don't overlap, so each phase is one add
+    channels = len(padded)
+    output = np.zeros((channels, (count - 1) * HOP + NPERSEG), dtype=np.float32)
+    for phase in range(NPERSEG // HOP):
+        phase_frames = frames[:, phase :: NPERSEG // HOP]
+        start = phase * HOP
+        end = start + phase_frames.shape[1] * NPERSEG
+        output[:, start:end] += phase_frames.reshape(channels, -1)
+    return output
 
-    return cleaned_audio_file
+
+def _window_norm(positions, segment_count, window_squared):
+    # Sum of squared windows covering each padded position, as istft divides by
+    norm = np.zeros(len(positions), dtype=np.float32)
+    last_frame = positions // HOP
+    for back in range(NPERSEG // HOP):
+        frame = last_frame - back
+        valid = (frame >= 0) & (frame < segment_count)
+        norm[valid] += window_squared[positions[valid] - frame[valid] * HOP]
+    return norm
+
+
+def _sample_range(dtype):
+    # Offset of silence and the (low, high) clip range for a PCM dtype
+    if np.issubdtype(dtype, np.floating):
+        return 0.0, (-1.0, 1.0)
+    info = np.iinfo(dtype)
+    offset = 128.0 if dtype == np.uint8 else 0.0
+    return offset, (info.min - offset, info.max - offset)
+
+
+def spectral_subtraction(
+    data,
+    rate,
+    noise_duration=0.5,
+    amplification_factor=1.9,
+    block_frames=None,
+    workers=None,
+):
+    """
+    Denoises PCM samples already in memory. `data` is (samples,) or
+    (samples, channels); every channel gets its own noise profile and the
+    result has the same shape and dtype as the input.
+
+    Matches scipy's stft/istft based spectral subtraction (hann window,
+    zero-padded boundaries) per channel, but transforms all channels in one
+    batched call per block of `block_frames` STFT frames, in float32 across
+    `workers` threads, so memory stays a small multiple of the raw audio.
+    """
+    block_frames = block_frames or DENOISE_BLOCK_FRAMES
+    workers = workers or DENOISE_WORKERS
+
+    layout = data.reshape(len(data), -1)
+    sample_count, channels = layout.shape
+    offset, (low, high) = _sample_range(data.dtype)
+
+    # Same zero padding as stft(boundary="zeros", padded=True)
+    tail = (-sample_count) % HOP
+    padded = np.zeros((channels, sample_count + NPERSEG + tail), dtype=np.float32)
+    padded[:, NPERSEG // 2 : NPERSEG // 2 + sample_count] = layout.T
+    if offset:
+        padded[:, NPERSEG // 2 : NPERSEG // 2 + sample_count] -= offset
+    segment_count = (sample_count + tail) // HOP + 1
+
+    window = get_window("hann", NPERSEG).astype(np.float32)
+
+    noise_frames = min(int(noise_duration * rate / HOP), segment_count)
+    noise_estimation = _noise_profile(padded, noise_frames, window, block_frames)
+
+    output = np.zeros(padded.shape, dtype=np.float32)
+    blocks = [
+        (first, min(block_frames, segment_count - first))
+        for first in range(0, segment_count, block_frames)
+    ]
+
+    def denoise(block):
+        return _denoise_block(padded, *block, window, noise_estimation)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Submit a few blocks at a time so finished blocks never pile up
+        for batch_start in range(0, len(blocks), workers * 2):
+            batch = blocks[batch_start : batch_start + workers * 2]
+            for (first, _), block_output in zip(batch, executor.map(denoise, batch)):
+                start = first * HOP
+                output[:, start : start + block_output.shape[1]] += block_output
+    del padded
+
+    # Normalise by the window overlap and drop the boundary padding
+    cleaned_data = output[:, NPERSEG // 2 : NPERSEG // 2 + sample_count]
+    window_squared = window**2
+    for start in range(0, sample_count, block_frames * HOP):
+        chunk = cleaned_data[:, start : start + block_frames * HOP]
+        positions = np.arange(chunk.shape[1]) + start + NPERSEG // 2
+        norm = _window_norm(positions, segment_count, window_squared)
+        np.divide(chunk, norm, out=chunk, where=norm > 1e-10)
+
+    # Adjust the magnitude
+    cleaned_data *= amplification_factor
+    np.clip(
+        cleaned_data, low, high, out=cleaned_data
+    )  # Clip to prevent values outside the sample range
+    if offset:
+        cleaned_data += offset
+
+    return cleaned_data.T.astype(data.dtype).reshape(data.shape)
@@ -0,0 +1,132 @@
+"""
+Compares the original whole-signal scipy stft/istft spectral subtraction
+(run once per channel) with the blocked engine in background_noise, for
+peak memory, speed and output difference, and the engine's batched
+multichannel transform with one engine pass per channel.
+
+    python -m benchmarks.denoise --minutes 1 10 30
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.signal import istft, stft
+
+from background_noise import spectral_subtraction
+
+
+def reference_spectral_subtraction(
+    data, rate, noise_duration=0.5, amplification_factor=1.9
+):
+    # The implementation background_noise used before the blocked engine
+    if len(data.shape) == 2:
+        data = data.mean(axis=1)
+
+    nperseg = 1024
+    noverlap = int(nperseg * 0.75)
+
+    f, t, Zxx = stft(data, fs=rate, nperseg=nperseg, noverlap=noverlap)
+
+    noise_frames = int(noise_duration * rate / (nperseg - noverlap))
+    noise_estimation = np.abs(Zxx[:, :noise_frames]).mean(axis=1).reshape(-1, 1)
+
+    Zxx_magnitude = np.abs(Zxx) - noise_estimation
+    Zxx_magnitude = np.maximum(Zxx_magnitude, 0)
+
+    Zxx_denoised = Zxx_magnitude * np.exp(1j * np.angle(Zxx))
+
+    _, cleaned_data = istft(Zxx_denoised, fs=rate, nperseg=nperseg, noverlap=noverlap)
+
+    cleaned_data = cleaned_data * amplification_factor
+    cleaned_data = np.clip(cleaned_data, -32768, 32767)
+
+    return cleaned_data.astype(np.int16)
+
+
+def reference_per_channel(data, rate):
+    return np.stack(
+        [
+            reference_spectral_subtraction(data[:, channel], rate)[: len(data)]
+            for channel in range(data.shape[1])
+        ],
+        axis=1,
+    )
+
+
+def engine_per_channel(data, rate):
+    return np.stack(
+        [
+            spectral_subtraction(data[:, channel], rate)
+            for channel in range(data.shape[1])
+        ],
+        axis=1,
+    )
+
+
+def noisy_speech(minutes, frame_rate=44100, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    frame_count = int(minutes * 60 * frame_rate)
+    t = np.arange(frame_count, dtype=np.float32) / frame_rate
+
+    # A warbling tone switched on and off over a constant hiss
+    tone = np.sin(2 * np.pi * (220 + 40 * np.sin(2 * np.pi * 0.5 * t)) * t)
+    gate = (np.sin(2 * np.pi * 0.3 * t) > 0).astype(np.float32)
+    hiss = rng.standard_normal((frame_count, channels), dtype=np.float32) * 300
+    samples = (tone * gate * 8000)[:, None] + hiss
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 30])
+    parser.add_argument(
+        "--reference-max-minutes",
+        type=float,
+        default=30,
+        help="Skip the original implementation above this length",
+    )
+    args = parser.parse_args()
+
+    rate = 44100
+    for minutes in args.minutes:
+        data = noisy_speech(minutes, rate)
+        raw_mb = data.nbytes / 1024**2
+
+        blocked, blocked_time, blocked_peak = measure(spectral_subtraction, data, rate)
+        _, split_time, _ = measure(engine_per_channel, data, rate)
+        line = (
+            f"{minutes:6.1f} min ({raw_mb:7.1f} MB raw)  "
+            f"blocked {blocked_time:7.2f}s peak {blocked_peak:8.1f} MB"
+            f" (per channel {split_time:7.2f}s)"
+        )
+
+        if minutes <= args.reference_max_minutes:
+            reference, reference_time, reference_peak = measure(
+                reference_per_channel, data, rate
+            )
+            difference = np.abs(
+                reference.astype(np.int32) - blocked.astype(np.int32)
+            ).max()
+            line += (
+                f"  | original {reference_time:7.2f}s peak {reference_peak:8.1f} MB"
+                f"  | speed-up {reference_time / blocked_time:4.1f}x"
+                f"  max diff {difference} LSB"
+            )
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
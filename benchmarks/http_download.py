@@ -0,0 +1,118 @@
+"""
+Runs utils.http_download against a local HTTP server and checks every
+download byte for byte: parallel Range parts, a server without Range
+support, gzip-encoded responses and connections dropped mid-part, which
+must be resumed. Reports throughput for each case.
+
+    python -m benchmarks.http_download --megabytes 64 256
+"""
+
+import argparse
+import gzip
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils import http_download
+
+# name: (honour Range, gzip whole-file responses, drop each part once)
+CASES = {
+    "ranges": (True, False, False),
+    "no-range": (False, False, False),
+    "gzip": (False, True, False),
+    "dropped": (True, False, True),
+}
+
+
+def make_handler(payload, ranges, compress, drop):
+    dropped = set()
+    dropped_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if not (ranges and match):
+                body = payload
+                self.send_response(200)
+                # Regardless of Accept-Encoding, like a misconfigured proxy
+                if compress:
+                    body = gzip.compress(payload, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            start = int(match.group(1))
+            end = int(match.group(2) or len(payload) - 1)
+            body = payload[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+
+            # A resumed request keeps its part's end, so each part drops once
+            with dropped_lock:
+                drop_now = drop and len(body) > 1 and end not in dropped
+                dropped.add(end)
+            if drop_now:
+                # Send half the part, then hang up
+                self.wfile.write(body[: len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    return Handler
+
+
+def run_case(name, payload, temp_dir):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(payload, *CASES[name]))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/input.bin"
+        dest_path = os.path.join(temp_dir, f"{name}.bin")
+
+        start = time.perf_counter()
+        written = http_download.download(url, dest_path)
+        elapsed = time.perf_counter() - start
+
+        with open(dest_path, "rb") as f:
+            intact = written == len(payload) and f.read() == payload
+        return elapsed, intact
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[64])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for megabytes in args.megabytes:
+            payload = rng.integers(0, 256, megabytes * 1024**2, dtype=np.uint8)
+            payload = payload.tobytes()
+
+            for name in args.cases:
+                elapsed, intact = run_case(name, payload, temp_dir)
+                print(
+                    f"{megabytes:6d} MB {name:9s} {elapsed:7.2f}s "
+                    f"({megabytes / elapsed:7.1f} MB/s) "
+                    f"{'ok' if intact else 'CORRUPT'}"
+                )
+
+
+if __name__ == "__main__":
+    main()
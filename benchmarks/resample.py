@@ -0,0 +1,100 @@
+"""
+Compares pydub's implicit format sync (what `+=` and `overlay` do when a
+48 kHz mono voice meets a 44.1 kHz stereo music bed) with converting each
+input once through utils.resample, for speed, peak memory and the error
+of a resampled test tone.
+
+    python -m benchmarks.resample --minutes 1 10 30
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from pydub import AudioSegment
+
+from utils.audio_buffer import AudioBuffer
+from utils.resample import target_format
+
+# High enough that linear interpolation error shows up
+TONE_HZ = 5000
+TONE_LEVEL = 10000
+
+
+def tone(minutes, frame_rate, channels):
+    t = np.arange(int(minutes * 60 * frame_rate)) / frame_rate
+    samples = (np.sin(2 * np.pi * TONE_HZ * t) * TONE_LEVEL).astype(np.int16)
+    return np.repeat(samples[:, None], channels, axis=1)
+
+
+def to_segment(samples, frame_rate):
+    return AudioSegment(
+        samples.tobytes(),
+        frame_rate=frame_rate,
+        sample_width=2,
+        channels=samples.shape[1],
+    )
+
+
+def pydub_sync(voice, bed):
+    # AudioSegment._sync is what `+`, `+=` and overlay run on mixed inputs
+    voice, bed = AudioSegment._sync(voice, bed)
+    return np.frombuffer(bed.raw_data, dtype=np.int16).reshape(-1, bed.channels)
+
+
+def soxr_sync(voice, bed):
+    frame_rate, channels = target_format(
+        (buffer.frame_rate, buffer.channels) for buffer in (voice, bed)
+    )
+    voice, bed = voice.convert(frame_rate, channels), bed.convert(frame_rate, channels)
+    return bed.samples
+
+
+def tone_error(samples, frame_rate):
+    # Largest deviation of the resampled bed from an ideal tone, away from
+    # the filter edges
+    t = np.arange(len(samples)) / frame_rate
+    ideal = np.sin(2 * np.pi * TONE_HZ * t) * TONE_LEVEL
+    edge = frame_rate // 10
+    return np.abs(samples[edge:-edge, 0] - ideal[edge:-edge]).max()
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 30])
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        voice = tone(minutes, 48000, 1)
+        bed = tone(minutes, 44100, 2)
+
+        pydub_bed, pydub_time, pydub_peak = measure(
+            pydub_sync, to_segment(voice, 48000), to_segment(bed, 44100)
+        )
+        soxr_bed, soxr_time, soxr_peak = measure(
+            soxr_sync, AudioBuffer(voice, 48000), AudioBuffer(bed, 44100)
+        )
+
+        print(
+            f"{minutes:6.1f} min"
+            f"  pydub {pydub_time:7.2f}s peak {pydub_peak:8.1f} MB"
+            f" error {tone_error(pydub_bed, 48000):7.1f}"
+            f"  | soxr {soxr_time:7.2f}s peak {soxr_peak:8.1f} MB"
+            f" error {tone_error(soxr_bed, 48000):7.1f}"
+            f"  | {pydub_time / soxr_time:5.1f}x faster"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares pydub.silence.detect_nonsilent with utils.silence_detector on
+synthetic speech-like audio.
+
+    python -m benchmarks.silence_detection --minutes 1 10 60
+"""
+
+import argparse
+import time
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent
+
+from utils.silence_detector import detect_nonsilent_fast
+
+
+def synthetic_speech(minutes, frame_rate=44100, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    frame_count = int(minutes * 60 * frame_rate)
+
+    # Alternate bursts of "speech" with quiet gaps of varying length
+    levels = np.empty(frame_count, dtype=np.float32)
+    position = 0
+    speaking = True
+    while position < frame_count:
+        if speaking:
+            length = int(rng.uniform(0.5, 6.0) * frame_rate)
+            level = rng.uniform(0.1, 0.5)
+        else:
+            length = int(rng.uniform(0.1, 2.0) * frame_rate)
+            level = rng.uniform(0.0005, 0.003)
+        levels[position : position + length] = level
+        position += length
+        speaking = not speaking
+
+    noise = rng.standard_normal((frame_count, channels), dtype=np.float32)
+    samples = np.clip(noise * levels[:, None], -1, 1) * 32767
+    return AudioSegment(
+        samples.astype(np.int16).tobytes(),
+        frame_rate=frame_rate,
+        sample_width=2,
+        channels=channels,
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    parser.add_argument("--min-silence-duration", type=int, default=300)
+    parser.add_argument("--silence-threshold", type=float, default=-36)
+    parser.add_argument(
+        "--pydub-max-minutes",
+        type=float,
+        default=10,
+        help="Skip pydub on inputs longer than this; it is O(duration * window).",
+    )
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        audio_segment = synthetic_speech(minutes)
+
+        fast_ranges, fast_time = timed(
+            detect_nonsilent_fast,
+            audio_segment,
+            min_silence_len=args.min_silence_duration,
+            silence_thresh=args.silence_threshold,
+        )
+
+        if minutes <= args.pydub_max_minutes:
+            pydub_ranges, pydub_time = timed(
+                detect_nonsilent,
+                audio_segment,
+                min_silence_len=args.min_silence_duration,
+                silence_thresh=args.silence_threshold,
+            )
+            print(
+                f"{minutes:>6.1f} min  pydub {pydub_time:9.2f}s  "
+                f"numpy {fast_time:7.3f}s  speed-up {pydub_time / fast_time:7.1f}x  "
+                f"identical={pydub_ranges == fast_ranges}"
+            )
+        else:
+            print(f"{minutes:>6.1f} min  pydub   skipped  numpy {fast_time:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares pydub's AudioSegment.speedup with utils.time_stretch (ffmpeg
+atempo) for wall time and peak memory on synthetic audio. pydub cannot
+slow audio down, so factors below 1 are only run through the engine.
+
+    python -m benchmarks.time_stretch --minutes 1 10 --factors 0.75 1.5 2.5
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pydub import AudioSegment
+from scipy.io import wavfile
+
+from utils.time_stretch import time_stretch
+
+
+def synthetic_audio(minutes, frame_rate=44100, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    frame_count = int(minutes * 60 * frame_rate)
+    t = np.arange(frame_count, dtype=np.float32) / frame_rate
+    tone = np.sin(2 * np.pi * (220 + 40 * np.sin(2 * np.pi * 0.5 * t)) * t) * 8000
+    hiss = rng.standard_normal((frame_count, channels), dtype=np.float32) * 300
+    return np.clip(tone[:, None] + hiss, -32768, 32767).astype(np.int16)
+
+
+def pydub_speedup(input_path, output_path, speed_factor):
+    # What audio_speed did before the atempo engine
+    audio_segment = AudioSegment.from_file(input_path)
+    audio_segment.speedup(playback_speed=speed_factor).export(output_path, format="wav")
+
+
+def measure_pydub(*args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    pydub_speedup(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024**2
+
+
+def run_engine(input_path, output_path, speed_factor):
+    # Runs in a fresh interpreter, so the only child it has reaped is this
+    # run's ffmpeg and RUSAGE_CHILDREN is that process's own peak
+    start = time.perf_counter()
+    time_stretch(input_path, output_path, speed_factor)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(elapsed, peak_kb / 1024)
+
+
+def measure_engine(input_path, output_path, speed_factor):
+    # RUSAGE_CHILDREN is a maximum over every child reaped so far, so each
+    # run gets its own process instead of reading it here
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.time_stretch", "--engine-run"]
+        + [input_path, output_path, str(speed_factor)],
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    elapsed, peak = result.stdout.split()
+    return float(elapsed), float(peak)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10])
+    parser.add_argument(
+        "--factors", type=float, nargs="+", default=[0.75, 1.25, 1.5, 2.5]
+    )
+    parser.add_argument("--engine-run", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine_run:
+        input_path, output_path, speed_factor = args.engine_run
+        run_engine(input_path, output_path, float(speed_factor))
+        return
+
+    rate = 44100
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "input.wav")
+        output_path = os.path.join(temp_dir, "output.wav")
+
+        for minutes in args.minutes:
+            wavfile.write(input_path, rate, synthetic_audio(minutes, rate))
+            audio_seconds = minutes * 60
+
+            for factor in args.factors:
+                elapsed, peak = measure_engine(input_path, output_path, factor)
+                line = (
+                    f"{minutes:6.1f} min x{factor:<5}"
+                    f"  atempo {elapsed:7.2f}s ({audio_seconds / elapsed:6.0f}x realtime)"
+                    f" child peak {peak:7.1f} MB"
+                )
+
+                if factor > 1:
+                    reference_time, reference_peak = measure_pydub(
+                        input_path, output_path, factor
+                    )
+                    line += (
+                        f"  | speedup {reference_time:7.2f}s peak {reference_peak:8.1f} MB"
+                        f"  | {reference_time / elapsed:5.1f}x faster"
+                    )
+
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
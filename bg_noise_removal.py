@@ -1,11 +1,10 @@
 import os
-import numpy as np
-from scipy.io import wavfile
-from scipy.signal import stft, istft
-from pydub import AudioSegment
 import tempfile
 import shutil
 from s3_operations import upload_to_s3
+from background_noise import spectral_subtraction
+from utils.audio_buffer import AudioBuffer
+from utils.audio_encoding import output_extension
 from utils.metrics import compute_audio_metrics
 from file_operations import *
 import logging
@@ -20,6 +19,7 @@ def remove_background_noise_from_audio(
     output_format="wav",
     userId=None,
     run_bulk=False,
+    audio_quality=None,
 ):
     try:
         logging.info(f"[BACKGROUND_NOISE_FUNCTION_STARTED]: {unique_uuid}.")
@@ -34,68 +34,40 @@ def remove_background_noise_from_audio(
         input_audio_local_path = os.path.join(temp_dir, original_name)
         download_file(input_audio_url, input_audio_local_path)
 
-        # Load the audio file using pydub
-        audio_segment = AudioSegment.from_file(input_audio_local_path)
+        # Decode straight to int16 samples, without a temp WAV round trip
+        audio_buffer = AudioBuffer.from_file(input_audio_local_path)
 
-        # Convert the audio to WAV format
-        wav_audio_path = os.path.join(temp_dir, "temp_audio.wav")
-        audio_segment.export(wav_audio_path, format="wav")
-
-        # Read in the WAV audio file
-        rate, data = wavfile.read(wav_audio_path)
-        if len(data.shape) == 2:  # Stereo
-            data = data.mean(axis=1)
-
-        # Parameters for STFT
-        nperseg = 1024
-        noverlap = int(nperseg * 0.75)
-
-        # Perform STFT
-        f, t, Zxx = stft(data, fs=rate, nperseg=nperseg, noverlap=noverlap)
-
-        # Estimate the noise using the first few frames (assuming they only contain noise)
-        noise_frames = int(noise_duration * rate / (nperseg - noverlap))
-        noise_estimation = np.abs(Zxx[:, :noise_frames]).mean(axis=1).reshape(-1, 1)
-
-        # Subtract the noise estimate from the magnitude spectrum
-        Zxx_magnitude = np.abs(Zxx) - noise_estimation
-        Zxx_magnitude = np.maximum(Zxx_magnitude, 0)  # ensure non-negative values
-
-        # Reconstruct the modified spectrum (keep the original phase)
-        Zxx_denoised = Zxx_magnitude * np.exp(1j * np.angle(Zxx))
-
-        # Perform inverse STFT
-        _, cleaned_data = istft(
-            Zxx_denoised, fs=rate, nperseg=nperseg, noverlap=noverlap
+        cleaned_data = spectral_subtraction(
+            audio_buffer.samples,
+            audio_buffer.frame_rate,
+            noise_duration,
+            amplification_factor,
         )
 
-        # Adjust the magnitude
-        cleaned_data = cleaned_data * amplification_factor
-        cleaned_data = np.clip(
-            cleaned_data, -32768, 32767
-        )  # Clip to prevent values outside int16 range
-
         # Write out the processed audio
         cleaned_audio_local_path = os.path.join(
-            temp_dir, f"output_{unique_uuid}.{output_format}"
+            temp_dir, f"output_{unique_uuid}.{output_extension(output_format)}"
         )
 
-        wavfile.write(cleaned_audio_local_path, rate, cleaned_data.astype(np.int16))
+        AudioBuffer(cleaned_data, audio_buffer.frame_rate).export(
+            cleaned_audio_local_path, output_format, audio_quality
+        )
 
         # Upload the cleaned audio to S3
-        output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+        output_audio_s3_path = f"{unique_uuid}_output.{output_extension(output_format)}"
 
         if run_bulk:
             file_path = cleaned_audio_local_path
         else:
-            output_audio_s3_path = f"{unique_uuid}_output.{output_format}"
+            output_audio_s3_path = (
+                f"{unique_uuid}_output.{output_extension(output_format)}"
+            )
             presignedUrl = upload_to_s3(
                 cleaned_audio_local_path, output_audio_s3_path, userId
             )
             file_path = presignedUrl
 
         # Compute metrics for the cleaned audio
-        cleaned_audio = AudioSegment.from_wav(cleaned_audio_local_path)
         # metrics = compute_audio_metrics(cleaned_audio)
 
         metrics = 0
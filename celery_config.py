@@ -1,12 +1,16 @@
 from celery import Celery
+from celery.worker.control import inspect_command
 from kombu import Exchange, Queue
 import os
 from dotenv import load_dotenv
 
+from utils.input_cache import input_cache_stats
+
 load_dotenv()
 
 BROKER_URL = os.environ.get("REDIS_URL") or os.environ.get("BROKER_URL")
-RESULT_BACKEND = "rpc://"
+# Chords (distributed rendering) need a backend such as Redis; rpc:// can't
+RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND") or "rpc://"
 TASK_SERIALIZER = "json"
 RESULT_SERIALIZER = "json"
 ACCEPT_CONTENT = ["json"]
@@ -30,6 +34,7 @@ def make_celery(app_name=__name__):
         include=[
             "video_processing",
             "audio_processing",
+            "distributed_render",
         ],  # Updated to include audio_processing
     )
     celery.conf.update(
@@ -45,3 +50,12 @@ def make_celery(app_name=__name__):
 
 
 celery_app = make_celery()
+
+
+@inspect_command()
+def input_cache(state):
+    """
+    This worker host's input cache counters, for
+    `celery_app.control.broadcast("input_cache", reply=True)`.
+    """
+    return input_cache_stats()
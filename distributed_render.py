@@ -0,0 +1,274 @@
+from celery import chord
+from celery_config import celery_app, RESULT_BACKEND
+from file_operations import *
+from file_duration import get_media_duration
+from communication import *
+from s3_operations import delete_from_s3, upload_to_s3
+from silence_analysis import analyze_silence
+from utils.file_standardiser import convert_to_standard_format
+from utils.media_info import probe_media
+from utils.metrics import compute_video_metrics
+from utils.silence_detector import merge_ranges
+from utils.video_render import (
+    encode_ranges,
+    run_ffmpeg,
+    snap_to_frames,
+    split_range_groups,
+)
+import logging
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Kept seconds rendered by one chunk task; shorter jobs stay on one worker
+DISTRIBUTED_CHUNK_SECONDS = int(os.environ.get("DISTRIBUTED_CHUNK_SECONDS", 600))
+
+
+def distributed_render_available():
+    # Chords need a result backend that can collect the chunk results
+    return not RESULT_BACKEND.startswith("rpc://")
+
+
+def plan_distributed_render(
+    temp_dir,
+    input_video_url,
+    unique_uuid,
+    userId=None,
+    silence_threshold=-36,
+    min_silence_duration=300,
+    padding=300,
+    remove_background_noise=False,
+    nonsilent_ranges=None,
+):
+    """
+    Downloads and probes the source once, standardising it the way the
+    single-worker path does. Detects the cut list (unless one is supplied),
+    snaps it to frames and splits it into chunks of about
+    DISTRIBUTED_CHUNK_SECONDS of output each, breaking only at cuts. A
+    converted source is uploaded for the chunk tasks to read. Returns
+    (nonsilent_ranges, chunks, render_source), where render_source is what
+    every chunk needs: the URL to cut from, whether it was uploaded here,
+    and the frame rate.
+    """
+    source_dir = os.path.join(temp_dir, "source")
+    source_path = os.path.join(
+        source_dir, sanitize_filename(os.path.basename(input_video_url.split("?")[0]))
+    )
+    download_file(input_video_url, source_path)
+
+    media_info = probe_media(source_path)
+    if not media_info.has_audio:
+        raise ValueError("No audio stream found in the input video.")
+    standard_path, media_info = convert_to_standard_format(
+        source_path, source_dir, media_info
+    )
+
+    render_source = {
+        "url": input_video_url,
+        "uploaded": False,
+        "frame_rate": media_info.video["frame_rate"] if media_info.has_video else None,
+    }
+
+    if nonsilent_ranges is None:
+        # Analysed like the single-worker path: from the uploaded bytes
+        analysis = analyze_silence(
+            temp_dir,
+            source_path,
+            unique_uuid,
+            media_type="video",
+            silence_threshold=silence_threshold,
+            min_silence_duration=min_silence_duration,
+            padding=padding,
+            remove_background_noise=remove_background_noise,
+            run_locally=True,
+        )
+        nonsilent_ranges = analysis["nonsilent_ranges"]
+        media_duration = analysis["media_duration"]
+    else:
+        media_duration = get_media_duration(standard_path)
+
+    # Whole frames per range, in seconds so they stay on frame boundaries,
+    # so each part's audio and video cut the same spans and the stitched
+    # output stays in sync
+    duration_ms = int(media_duration * 1000)
+    ranges = snap_to_frames(
+        [
+            (start / 1000, end / 1000)
+            for start, end in merge_ranges(nonsilent_ranges, duration_ms)
+        ],
+        media_info,
+    )
+
+    kept_seconds = sum(end - start for start, end in ranges)
+    chunk_count = max(int(-(-kept_seconds // DISTRIBUTED_CHUNK_SECONDS)), 1)
+    chunks = split_range_groups(ranges, chunk_count)
+
+    logging.info(
+        f"[DISTRIBUTED_RENDER_PLAN]: {unique_uuid} {kept_seconds:.0f}s kept, "
+        f"{len(chunks)} chunks"
+    )
+
+    # Only worth uploading when the chunks will actually be rendered elsewhere
+    if len(chunks) > 1 and standard_path != source_path:
+        render_source["url"] = upload_to_s3(
+            standard_path, f"{unique_uuid}_source.mp4", userId, folder="parts"
+        )
+        render_source["uploaded"] = True
+
+    return nonsilent_ranges, chunks, render_source
+
+
+def dispatch_distributed_render(
+    input_video_url,
+    render_source,
+    chunks,
+    email,
+    unique_uuid,
+    userId=None,
+    nonsilent_ranges=None,
+):
+    """
+    Renders every chunk as its own task on any video worker and stitches
+    the parts in a final task once all of them are done.
+    """
+    header = [
+        render_chunk.s(render_source, chunk, index, unique_uuid, userId)
+        for index, chunk in enumerate(chunks)
+    ]
+    # Fixed up front so the error callback can find the parts that did upload
+    chunk_task_ids = [signature.freeze().id for signature in header]
+    callback = stitch_chunks.s(
+        email, unique_uuid, input_video_url, render_source, userId, nonsilent_ranges
+    ).on_error(distributed_render_failed.s(unique_uuid, render_source, chunk_task_ids))
+
+    chord(header)(callback)
+    logging.info(f"[DISTRIBUTED_RENDER_DISPATCHED]: {unique_uuid}")
+
+
+@celery_app.task(
+    name="distributed_render.render_chunk", queue="video_processing", max_retries=2
+)
+def render_chunk(render_source, chunk, index, unique_uuid, userId=None):
+    """
+    Cuts and encodes one chunk (ranges in seconds) straight from the planned
+    source URL; ffmpeg seeks over HTTP, so only the chunk's part of the file
+    is fetched. Every chunk is encoded at the source's probed frame rate, so
+    the parts can be joined without re-encoding. Returns the presigned URL
+    of the uploaded part.
+    """
+    logging.info(f"[RENDER_CHUNK_STARTED]: {unique_uuid} #{index}")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        part_path = os.path.join(temp_dir, f"{unique_uuid}_part_{index:03d}.mp4")
+        encode_ranges(
+            render_source["url"],
+            chunk,
+            part_path,
+            os.path.join(temp_dir, "cut_filter.txt"),
+            frame_rate=render_source["frame_rate"],
+        )
+        part_url = upload_to_s3(
+            part_path, os.path.basename(part_path), userId, folder="parts"
+        )
+        logging.info(f"[RENDER_CHUNK_DONE]: {unique_uuid} #{index}")
+        return part_url
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def delete_parts(part_urls):
+    for part_url in part_urls:
+        try:
+            delete_from_s3(part_url)
+        except Exception as e:
+            logging.warning(f"Failed to delete render part. Error: {str(e)}")
+
+
+@celery_app.task(
+    name="distributed_render.stitch_chunks", queue="video_processing", max_retries=2
+)
+def stitch_chunks(
+    part_urls,
+    email,
+    unique_uuid,
+    input_video_url,
+    render_source,
+    userId=None,
+    nonsilent_ranges=None,
+):
+    logging.info(f"[STITCH_CHUNKS_STARTED]: {unique_uuid} {len(part_urls)} parts")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        concat_list_path = os.path.join(temp_dir, "parts.txt")
+        with open(concat_list_path, "w") as concat_list:
+            for index, part_url in enumerate(part_urls):
+                part_path = os.path.join(temp_dir, f"part_{index:03d}.mp4")
+                download_file(part_url, part_path)
+                concat_list.write(f"file '{part_path}'\n")
+
+        output_path = os.path.join(temp_dir, f"output_{unique_uuid}.mp4")
+        run_ffmpeg(
+            ["-f", "concat", "-safe", "0", "-i", concat_list_path, "-c", "copy"]
+            + ["-movflags", "+faststart", output_path]
+        )
+
+        # Same metrics the single-worker video render reports
+        metrics = compute_video_metrics(
+            probe_media(render_source["url"]),
+            probe_media(output_path),
+            nonsilent_ranges or [],
+        )
+
+        logging.info(f"[UPLOADING_TO_S3]: {unique_uuid}")
+        output_url = upload_to_s3(output_path, f"{unique_uuid}_output.mp4", userId)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        # The parts (and a standardised source) are only needed for this job
+        delete_parts(
+            part_urls + ([render_source["url"]] if render_source["uploaded"] else [])
+        )
+
+    try:
+        send_email(email, output_url, media_type="Video")
+    except Exception as e:
+        logging.error(f"Failed to send email. Error: {str(e)}")
+
+    try:
+        trigger_webhook(unique_uuid, output_url, input_video_url, metrics)
+    except Exception as e:
+        logging.error(f"Failed to trigger webhook. Error: {str(e)}")
+
+    logging.info(f"[VIDEO_PROCESSING_COMPLETED]: {output_url} {unique_uuid}.")
+    return output_url
+
+
+@celery_app.task(name="distributed_render.distributed_render_failed")
+def distributed_render_failed(
+    request, exc, traceback, unique_uuid, render_source=None, chunk_task_ids=()
+):
+    """
+    Runs when a chunk or the stitch fails. The chord only gives up once every
+    chunk has returned, so the parts that did render are all uploaded by now;
+    they and a standardised source are deleted along with the failure webhook.
+    """
+    logging.error(f"Distributed render failed for {unique_uuid}. Error: {str(exc)}")
+
+    part_urls = []
+    for task_id in chunk_task_ids:
+        result = celery_app.AsyncResult(task_id)
+        try:
+            if result.successful():
+                part_urls.append(result.result)
+        except Exception as e:
+            logging.warning(f"Failed to look up render part. Error: {str(e)}")
+    if render_source and render_source["uploaded"]:
+        part_urls.append(render_source["url"])
+    delete_parts(part_urls)
+
+    try:
+        send_failure_webhook(f"A processing error occurred: {str(exc)}", unique_uuid)
+    except Exception as e:
+        logging.error(f"Failed to send failure webhook. Error: {str(e)}")
@@ -62,7 +62,7 @@ def remove_silence(
 
         os.environ["MOVIEPY_TEMP_FOLDER"] = temp_dir
 
-        unique_video_local_path = convert_to_standard_format(
+        unique_video_local_path, _ = convert_to_standard_format(
             unique_video_local_path, temp_dir
         )
 
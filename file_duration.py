@@ -64,6 +64,16 @@ def calculate_cost(duration: float, task_type: str) -> float:
     return round(running_cost, 2)
 
 
+def calculate_pipeline_cost(duration: float, operations: List[dict]) -> float:
+    # A pipeline costs what its operations would cost as separate tasks
+    return round(
+        sum(
+            calculate_cost(duration, operation["task_type"]) for operation in operations
+        ),
+        2,
+    )
+
+
 def task_level_costs(task_type: str) -> float:
     if task_type == "remove_silence_video":
         return 1.5
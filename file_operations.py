@@ -4,11 +4,11 @@ from uuid import uuid4
 import requests
 import re
 from utils.retries import retry
+from utils.input_cache import cached_download
 import shutil
 
-retry(attempts=3, delay=5)
-
 
+@retry(attempts=3, delay=5, allowed_exceptions=(requests.RequestException,))
 def download_file(url, dest_path, run_locally=False):
     try:
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
@@ -21,11 +21,9 @@ def download_file(url, dest_path, run_locally=False):
                 logging.error(f"Local file {url} does not exist.")
                 raise FileNotFoundError(f"Local file {url} does not exist.")
         else:
-            r = requests.get(url, stream=True)
-            r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(1024):
-                    f.write(chunk)
+            # Parallel Range requests over the worker's pooled session,
+            # served from the worker's input cache when unchanged
+            cached_download(url, dest_path)
 
         logging.info("[FILE_DOWNLOADED]")
     except requests.RequestException as e:
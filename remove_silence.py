@@ -1,5 +1,3 @@
-from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from moviepy.video.compositing.concatenate import concatenate_videoclips
 import logging
@@ -12,15 +10,23 @@ from s3_operations import upload_to_s3
 
 # from utils.safeprocess import safe_process
 from utils.file_standardiser import convert_to_standard_format
-from utils.metrics import compute_video_metrics
-from utils.detect_silence_threshold import (
-    compute_silence_threshold,
-    compute_dynamic_silence_threshold,
+from utils.media_info import probe_media
+from utils.silence_detector import (
+    STREAMING_DENOISE_ERROR,
+    choose_cut_list,
+    detect_nonsilent_streaming,
+    merge_ranges,
+    select_nonsilent_ranges,
 )
+from utils.video_render import RENDER_MODES, render_video
+from utils.envelope_cache import cached_pcm_envelope, envelope_cache_key
+from utils.pcm_stream import ANALYSIS_CHANNELS, ANALYSIS_SAMPLE_RATE, read_pcm
+from utils.metrics import compute_video_metrics
+from utils.detect_silence_threshold import adaptive_silence_thresholds
 
 from generate_xml import generate_premiere_xml
 
-from background_noise import denoise_audio_spectral_subtraction
+from background_noise import spectral_subtraction
 
 # from background_noise import clean_background_noise
 
@@ -28,6 +34,28 @@ from background_noise import denoise_audio_spectral_subtraction
 load_dotenv()
 
 
+def video_envelope_key(video_path, remove_background_noise=False):
+    variant = "video:pcm16k:denoised" if remove_background_noise else "video:pcm16k"
+    return envelope_cache_key(video_path, variant)
+
+
+def extract_analysis_audio(video_path, remove_background_noise=False):
+    """
+    Decodes the audio stream once, straight from the video into a mono
+    16 kHz int16 array; denoise, threshold estimation and detection all work
+    on this one buffer. Returns (samples, sample_rate).
+    """
+    samples = read_pcm(video_path, ANALYSIS_SAMPLE_RATE, ANALYSIS_CHANNELS)
+
+    if remove_background_noise:
+        # Keep the (frames, channels) shape the envelope and cache expect
+        samples = spectral_subtraction(samples, ANALYSIS_SAMPLE_RATE).reshape(
+            len(samples), ANALYSIS_CHANNELS
+        )
+
+    return samples, ANALYSIS_SAMPLE_RATE
+
+
 def remove_silence(
     temp_dir,
     input_video_url,
@@ -40,10 +68,19 @@ def remove_silence(
     generate_xml=False,
     run_locally=False,
     run_bulk=False,
+    threshold_candidates=None,
+    streaming_detection=False,
+    nonsilent_ranges=None,
+    render_mode="moviepy",
 ):
     try:
         logging.info(f"[REMOVE_SILENCE_FUNCTION_STARTED]: {unique_uuid}.")
 
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Invalid render_mode: {render_mode}")
+        if streaming_detection and remove_background_noise:
+            raise ValueError(STREAMING_DENOISE_ERROR)
+
         # Determine original_name based on the URL extension
         original_name = os.path.basename(input_video_url.split("?")[0])
 
@@ -65,72 +102,122 @@ def remove_silence(
 
         os.environ["MOVIEPY_TEMP_FOLDER"] = temp_dir
 
+        # Keyed on the uploaded bytes, before any conversion, so resubmitting
+        # the same file with other settings reuses the analysis.
+        if nonsilent_ranges is None and not streaming_detection:
+            envelope_key = video_envelope_key(
+                unique_video_local_path, remove_background_noise
+            )
+
+        # One probe per job; the conversion policy and the renderers read it
+        media_info = probe_media(unique_video_local_path)
+        if not media_info.has_audio:
+            raise ValueError(f"No audio stream found in {input_video_file_name}.")
+
         if not run_locally:
-            unique_video_local_path = convert_to_standard_format(
-                unique_video_local_path, temp_dir
+            unique_video_local_path, media_info = convert_to_standard_format(
+                unique_video_local_path, temp_dir, media_info
             )
 
         video = VideoFileClip(unique_video_local_path)
 
-        audio = video.audio
-        audio_file = os.path.join(temp_dir, "temp_audio.wav")
+        thresholds = list(threshold_candidates or [silence_threshold])
+
+        if nonsilent_ranges is not None:
+            # A cut list from /analyze-silence/ (possibly edited by the
+            # client) is rendered as-is, without any detection.
+            logging.info(f"[USING_SUPPLIED_CUT_LIST]: {len(nonsilent_ranges)} ranges")
+        elif streaming_detection:
+            # Decode through an ffmpeg pipe in fixed-size chunks instead of
+            # loading the whole track. The mean-volume candidate needs a full
+            # pass of its own, so only the requested thresholds are tried.
+            candidates, duration_ms = detect_nonsilent_streaming(
+                unique_video_local_path, thresholds, min_silence_duration
+            )
+            silence_threshold, nonsilent_ranges = choose_cut_list(
+                candidates, duration_ms, padding, max_kept_ratio=0.95
+            )
+        else:
+            # Analyse once and try every candidate threshold against the same
+            # envelope; only the winning cut list gets rendered. A cached
+            # envelope skips the audio decode entirely.
+            envelope = cached_pcm_envelope(
+                envelope_key,
+                lambda: extract_analysis_audio(
+                    unique_video_local_path, remove_background_noise
+                ),
+            )
 
-        audio.write_audiofile(audio_file, logger=None)
+            adaptive_thresholds = adaptive_silence_thresholds(envelope)
+            thresholds[1:1] = adaptive_thresholds
 
-        if remove_background_noise:
-            denoised_audio_file = denoise_audio_spectral_subtraction(audio_file)
-            audio_segment = AudioSegment.from_file(denoised_audio_file)
-        else:
-            audio_segment = AudioSegment.from_file(audio_file)
+            silence_threshold, nonsilent_ranges = select_nonsilent_ranges(
+                envelope,
+                thresholds,
+                min_silence_duration,
+                padding,
+                max_kept_ratio=0.95,
+                fallback_threshold=adaptive_thresholds[0],
+            )
 
-        # silence_threshold = compute_dynamic_silence_threshold(audio_file)
+        logging.info(f"[SELECTED_SILENCE_THRESHOLD]: {silence_threshold}")
+
+        if generate_xml:
+            xml_output_path = os.path.join(temp_dir, f"{unique_uuid}_cuts.xml")
+            generate_premiere_xml(
+                sequence_name=f"{unique_uuid}_sequence",
+                video_file_name=input_video_file_name,
+                video_file_path=unique_video_local_path,
+                video_duration=video.duration,
+                nonsilent_ranges=nonsilent_ranges,
+                output_path=xml_output_path,
+                width=video.size[0],
+                height=video.size[1],
+            )
+
+            if run_locally:
+                original_dir = os.path.dirname(input_video_url)
+                local_save_path = os.path.join(original_dir, f"{unique_uuid}_cuts.xml")
+                shutil.copyfile(xml_output_path, local_save_path)
+                logging.info(f"[SAVED_LOCALLY]: {local_save_path}")
+            else:
+                xml_s3_path = f"{unique_uuid}_cuts.xml"
+                logging.info(f"[UPLOADING_XML_TO_S3]: {unique_uuid}")
+                presignedUrl = upload_to_s3(xml_output_path, xml_s3_path, userId)
 
-        loop_counter = 0
-        while loop_counter < 2:
-            nonsilent_ranges = detect_nonsilent(
-                audio_segment,
-                min_silence_len=min_silence_duration,
-                silence_thresh=silence_threshold,
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+
+            return (
+                local_save_path if run_locally else presignedUrl,
+                unique_uuid,
+                None,
             )
 
-            nonsilent_ranges = [
-                (start - padding, end + padding) for start, end in nonsilent_ranges
-            ]
-
-            if generate_xml:
-                xml_output_path = os.path.join(temp_dir, f"{unique_uuid}_cuts.xml")
-                generate_premiere_xml(
-                    sequence_name=f"{unique_uuid}_sequence",
-                    video_file_name=input_video_file_name,
-                    video_file_path=unique_video_local_path,
-                    video_duration=video.duration,
-                    nonsilent_ranges=nonsilent_ranges,
-                    output_path=xml_output_path,
-                    width=video.size[0],
-                    height=video.size[1],
-                )
+        output_video_local_path = os.path.join(
+            temp_dir,
+            f"output_{unique_uuid}" + os.path.splitext(input_video_file_name)[1],
+        )
 
-                if run_locally:
-                    original_dir = os.path.dirname(input_video_url)
-                    local_save_path = os.path.join(
-                        original_dir, f"{unique_uuid}_cuts.xml"
-                    )
-                    shutil.copyfile(xml_output_path, local_save_path)
-                    logging.info(f"[SAVED_LOCALLY]: {local_save_path}")
-                else:
-                    xml_s3_path = f"{unique_uuid}_cuts.xml"
-                    logging.info(f"[UPLOADING_XML_TO_S3]: {unique_uuid}")
-                    presignedUrl = upload_to_s3(xml_output_path, xml_s3_path, userId)
-
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-
-                return (
-                    local_save_path if run_locally else presignedUrl,
-                    unique_uuid,
-                    None,
-                )
+        if render_mode != "moviepy":
+            # ffmpeg renders straight from the source file instead of moviepy.
+            # Overlapping padded ranges are merged rather than repeated.
+            render_video(
+                render_mode,
+                unique_video_local_path,
+                merge_ranges(nonsilent_ranges, int(video.duration * 1000)),
+                output_video_local_path,
+                temp_dir,
+                media_info=media_info,
+            )
 
+            if not run_locally:
+                final_video = VideoFileClip(output_video_local_path)
+                metrics = compute_video_metrics(video, final_video, nonsilent_ranges)
+                final_video.close()
+            else:
+                metrics = None
+        else:
             non_silent_subclips = []
             for start, end in nonsilent_ranges:
                 start_time = max(start / 1000, 0)
@@ -144,69 +231,51 @@ def remove_silence(
 
             final_video = concatenate_videoclips(non_silent_subclips, method="compose")
 
-            # Determine durations for comparison
-            original_duration = video.duration
-            final_duration = final_video.duration
-
             logging.info(
-                f"[ORIGINAL_DURATION]: {original_duration} [FINAL_DURATION]: {final_duration}"
+                f"[ORIGINAL_DURATION]: {video.duration} [FINAL_DURATION]: {final_video.duration}"
             )
 
-            if (
-                original_duration > final_duration
-                and original_duration * 0.95 > final_duration
-            ):
-                break
-
-            silence_threshold = compute_silence_threshold(audio_file)
-            loop_counter += 1
-
-        temp_videofile_path = os.path.join(temp_dir, "temp_videofile.mp4")
-
-        temp_audiofile_path = os.path.join(
-            temp_dir, "temp_audio_for_video_conversion.mp3"
-        )
+            temp_videofile_path = os.path.join(temp_dir, "temp_videofile.mp4")
 
-        logging.info(f"[WRITING_FINAL_VIDEO]: {unique_uuid}")
-
-        final_video.write_videofile(
-            temp_videofile_path,
-            codec="libx264",
-            bitrate="1500k",
-            threads=os.environ.get("PROCESS_THREADS"),
-            preset="faster",
-            audio_bitrate="128k",
-            audio_fps=44100,
-            write_logfile=False,
-            logger=None,
-            temp_audiofile=temp_audiofile_path,
-        )
+            temp_audiofile_path = os.path.join(
+                temp_dir, "temp_audio_for_video_conversion.mp3"
+            )
 
-        if not run_locally:
-            metrics = compute_video_metrics(video, final_video, nonsilent_ranges)
+            logging.info(f"[WRITING_FINAL_VIDEO]: {unique_uuid}")
+
+            final_video.write_videofile(
+                temp_videofile_path,
+                codec="libx264",
+                bitrate="1500k",
+                threads=os.environ.get("PROCESS_THREADS"),
+                preset="faster",
+                audio_bitrate="128k",
+                audio_fps=44100,
+                write_logfile=False,
+                logger=None,
+                temp_audiofile=temp_audiofile_path,
+            )
 
-        else:
-            metrics = None
+            if not run_locally:
+                metrics = compute_video_metrics(video, final_video, nonsilent_ranges)
 
-        audio_with_fps = final_video.audio.set_fps(video.audio.fps)
+            else:
+                metrics = None
 
-        temp_audiofile_path = os.path.join(temp_dir, "temp_audiofile.mp3")
+            audio_with_fps = final_video.audio.set_fps(video.audio.fps)
 
-        audio_with_fps.write_audiofile(temp_audiofile_path, logger=None)
+            temp_audiofile_path = os.path.join(temp_dir, "temp_audiofile.mp3")
 
-        output_video_local_path = os.path.join(
-            temp_dir,
-            f"output_{unique_uuid}" + os.path.splitext(input_video_file_name)[1],
-        )
+            audio_with_fps.write_audiofile(temp_audiofile_path, logger=None)
 
-        cmd = f'ffmpeg -y -i "{os.path.normpath(temp_videofile_path)}" -i "{os.path.normpath(temp_audiofile_path)}" -c:v copy -c:a aac -strict experimental -shortest "{os.path.normpath(output_video_local_path)}" -loglevel error'
-        subprocess.run(
-            cmd,
-            shell=True,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.STDOUT,
-        )
+            cmd = f'ffmpeg -y -i "{os.path.normpath(temp_videofile_path)}" -i "{os.path.normpath(temp_audiofile_path)}" -c:v copy -c:a aac -strict experimental -shortest "{os.path.normpath(output_video_local_path)}" -loglevel error'
+            subprocess.run(
+                cmd,
+                shell=True,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.STDOUT,
+            )
 
         video.close()
 
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 import os
 from utils.retries import retry
 from datetime import datetime
+from urllib.parse import unquote, urlsplit
 
 # Load the environment variables
 load_dotenv()
@@ -28,6 +29,14 @@ def determine_content_type(file_path):
         return "audio/wav"
     elif file_path.endswith(".mp3"):
         return "audio/mpeg"
+    elif file_path.endswith(".flac"):
+        return "audio/flac"
+    elif file_path.endswith(".opus") or file_path.endswith(".ogg"):
+        return "audio/ogg"
+    elif file_path.endswith(".m4a"):
+        return "audio/mp4"
+    elif file_path.endswith(".aac"):
+        return "audio/aac"
     elif file_path.endswith(".zip"):
         return "application/zip"
     else:
@@ -68,3 +77,20 @@ def upload_to_s3(local_path, s3_path, userId, folder="trimmed"):
     except Exception as e:
         logging.warning(f"Failed to upload to S3. Error: {str(e)}")
         raise
+
+
+@retry(attempts=3, delay=5)
+def delete_from_s3(presigned_url):
+    """
+    Deletes the object behind a presigned URL returned by upload_to_s3.
+    """
+    url = urlsplit(presigned_url)
+    key = unquote(url.path).lstrip("/")
+    # Path-style URLs carry the bucket as the first path segment
+    if not url.netloc.startswith(f"{BUCKET_NAME}.") and key.startswith(
+        f"{BUCKET_NAME}/"
+    ):
+        key = key[len(BUCKET_NAME) + 1 :]
+
+    s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+    logging.info("[DELETED_FROM_S3]")
@@ -0,0 +1,120 @@
+import logging
+import os
+from file_operations import *
+from dotenv import load_dotenv
+
+from utils.audio_buffer import AudioBuffer
+from utils.envelope_cache import cached_pcm_envelope, envelope_cache_key
+from utils.metrics import compute_audio_metrics
+from utils.detect_silence_threshold import adaptive_silence_thresholds
+from utils.silence_detector import (
+    candidate_thresholds,
+    merge_ranges,
+    select_nonsilent_ranges,
+)
+from remove_silence import extract_analysis_audio, video_envelope_key
+from background_noise import spectral_subtraction
+
+# Load the environment variables
+load_dotenv()
+
+
+def decode_audio_for_analysis(input_audio_local_path, remove_background_noise):
+    audio_buffer = AudioBuffer.from_file(input_audio_local_path)
+
+    if remove_background_noise:
+        audio_buffer = AudioBuffer(
+            spectral_subtraction(audio_buffer.samples, audio_buffer.frame_rate),
+            audio_buffer.frame_rate,
+        )
+
+    return audio_buffer.samples, audio_buffer.frame_rate
+
+
+def analyze_silence(
+    temp_dir,
+    input_media_url,
+    unique_uuid,
+    media_type="video",
+    silence_threshold=-36,
+    min_silence_duration=300,
+    padding=300,
+    remove_background_noise=False,
+    run_locally=False,
+):
+    """
+    Runs only download, audio decode and detection, and returns the padded
+    cut list that remove_silence/remove_silence_audio would render. The
+    envelope is cached, so a later render or re-analysis of the same upload
+    does not decode it again.
+    """
+    try:
+        logging.info(f"[ANALYZE_SILENCE_FUNCTION_STARTED]: {unique_uuid}.")
+
+        original_name = os.path.basename(input_media_url.split("?")[0])
+        original_name = sanitize_filename(original_name)
+
+        _, file_extension = os.path.splitext(original_name)
+        if not file_extension:
+            original_name += ".mp4" if media_type == "video" else ".wav"
+
+        input_local_path = os.path.join(temp_dir, original_name)
+        download_file(input_media_url, input_local_path, run_locally=run_locally)
+
+        if media_type == "video":
+            # Same cache variant and decode as remove_silence
+            envelope = cached_pcm_envelope(
+                video_envelope_key(input_local_path, remove_background_noise),
+                lambda: extract_analysis_audio(
+                    input_local_path, remove_background_noise
+                ),
+            )
+            max_kept_ratio = 0.95
+        else:
+            # Same cache variant and decode as remove_silence_audio
+            envelope_key = envelope_cache_key(
+                input_local_path,
+                "audio:denoised" if remove_background_noise else "audio",
+            )
+            envelope = cached_pcm_envelope(
+                envelope_key,
+                lambda: decode_audio_for_analysis(
+                    input_local_path, remove_background_noise
+                ),
+            )
+            max_kept_ratio = 0.85
+
+        thresholds = candidate_thresholds(silence_threshold)
+        adaptive_thresholds = adaptive_silence_thresholds(envelope)
+        thresholds[1:1] = adaptive_thresholds
+
+        silence_threshold, nonsilent_ranges = select_nonsilent_ranges(
+            envelope,
+            thresholds,
+            min_silence_duration,
+            padding,
+            max_kept_ratio=max_kept_ratio,
+            fallback_threshold=adaptive_thresholds[0],
+        )
+
+        # Padding pushes the outer ranges past the media and makes neighbours
+        # overlap; clip and merge so /render-cuts/ accepts the list as-is
+        nonsilent_ranges = merge_ranges(nonsilent_ranges, len(envelope))
+
+        original_duration = len(envelope) / 1000
+        metrics = compute_audio_metrics(original_duration, nonsilent_ranges)
+
+        logging.info(f"[ANALYZE_SILENCE_COMPLETED]: {unique_uuid}.")
+
+        return {
+            "nonsilent_ranges": [
+                [int(start), int(end)] for start, end in nonsilent_ranges
+            ],
+            "silence_threshold": silence_threshold,
+            "media_duration": original_duration,
+            "metrics": metrics,
+        }
+
+    except Exception as e:
+        logging.error(f"Error analysing media {input_media_url}. Error: {str(e)}")
+        raise
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from utils.silence_detector import (
+    choose_cut_list,
+    compute_energy_envelope,
+    merge_ranges,
+    select_nonsilent_ranges,
+    validate_cut_list,
+)
+
+DURATION_MS = 10000
+
+# Every candidate keeps more than max_kept_ratio of the input
+CANDIDATES = [
+    (-40, [[0, 9600]]),
+    (-32, [[0, 9700]]),
+    (-28, [[0, 9800]]),
+    (-45, [[0, 9900]]),
+    (-50, []),
+]
+
+
+def choose(candidates, fallback_threshold=None):
+    silence_thresh, nonsilent_ranges = choose_cut_list(
+        candidates, DURATION_MS, 0, 0.85, fallback_threshold
+    )
+    return silence_thresh, [list(r) for r in nonsilent_ranges]
+
+
+def test_meets_max_kept_ratio():
+    candidates = [(-40, [[0, 9600]]), (-32, [[1000, 4000], [6000, 8000]])]
+
+    assert choose(candidates) == (-32, [[1000, 4000], [6000, 8000]])
+
+
+def test_falls_back_to_mean_volume_candidate():
+    assert choose(CANDIDATES, fallback_threshold=-32) == (-32, [[0, 9700]])
+
+
+def test_falls_back_to_last_non_empty_candidate():
+    assert choose(CANDIDATES) == (-45, [[0, 9900]])
+    assert choose(CANDIDATES, fallback_threshold=-50) == (-45, [[0, 9900]])
+
+
+def test_analyze_output_renders_unchanged():
+    # Speech right at both ends, so padding runs past the media
+    frame_rate = 16000
+    samples = np.zeros(10 * frame_rate, dtype=np.int16)
+    for start, end in ((0, 3), (5.5, 6.5), (9, 10)):
+        samples[int(start * frame_rate) : int(end * frame_rate)] = 8000
+    envelope = compute_energy_envelope(samples, frame_rate, 32768)
+
+    _, padded = select_nonsilent_ranges(envelope, [-40], 500, 300, 0.95)
+    with pytest.raises(ValueError):
+        validate_cut_list(padded, len(envelope))
+
+    # What /analyze-silence/ returns
+    nonsilent_ranges = merge_ranges(padded, len(envelope))
+
+    assert nonsilent_ranges[0][0] == 0
+    assert nonsilent_ranges[-1][1] == len(envelope)
+    assert validate_cut_list(nonsilent_ranges, len(envelope)) == nonsilent_ranges
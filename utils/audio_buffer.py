@@ -0,0 +1,112 @@
+import numpy as np
+
+from utils.pcm_stream import pcm_encoder, probe_audio_format, read_pcm
+from utils.resample import convert_samples, target_format
+
+
+class AudioBuffer:
+    """
+    Decoded audio as a (frames, channels) int16 array and its frame rate.
+
+    Stands in for pydub's AudioSegment in the audio tasks: slicing by
+    milliseconds returns views instead of copies, `gather` copies any number
+    of ranges into one preallocated array, and `export` streams the samples
+    into an ffmpeg encoder pipe instead of going through a temp WAV file.
+    """
+
+    def __init__(self, samples, frame_rate):
+        self.samples = samples.reshape(len(samples), -1)
+        self.frame_rate = frame_rate
+
+    @classmethod
+    def from_file(cls, path, frame_rate=None, channels=None):
+        """
+        Decodes `path`, at its own rate and channel count unless given.
+        """
+        if frame_rate is None or channels is None:
+            probed_rate, probed_channels = probe_audio_format(path)
+            frame_rate = frame_rate or probed_rate
+            channels = channels or probed_channels
+        return cls(read_pcm(path, frame_rate, channels), frame_rate)
+
+    @classmethod
+    def from_files(cls, paths):
+        """
+        Decodes every path at its own format, then converts each one once to
+        the common target_format so they can be mixed sample for sample.
+        """
+        buffers = [cls.from_file(path) for path in paths]
+        frame_rate, channels = target_format(
+            (buffer.frame_rate, buffer.channels) for buffer in buffers
+        )
+        return [buffer.convert(frame_rate, channels) for buffer in buffers]
+
+    @property
+    def channels(self):
+        return self.samples.shape[1]
+
+    @property
+    def frame_count(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return self.frame_count / self.frame_rate
+
+    @property
+    def duration_ms(self):
+        # Same rounding as len(AudioSegment)
+        return round(1000 * self.frame_count / self.frame_rate)
+
+    def _frame(self, ms):
+        # Same ms -> frame rounding as pydub slicing, clipped to the buffer
+        frame = int(ms * self.frame_rate / 1000.0)
+        return min(max(frame, 0), self.frame_count)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("AudioBuffer only supports [start_ms:end_ms] slices.")
+        start = 0 if key.start is None else self._frame(key.start)
+        end = self.frame_count if key.stop is None else self._frame(key.stop)
+        return AudioBuffer(self.samples[start : max(start, end)], self.frame_rate)
+
+    def gather(self, ranges_ms):
+        """
+        New buffer holding the (start_ms, end_ms) ranges back to back, copied
+        once into a single preallocated array.
+        """
+        bounds = [(self._frame(start), self._frame(end)) for start, end in ranges_ms]
+        bounds = [(start, end) for start, end in bounds if end > start]
+
+        output = np.empty(
+            (sum(end - start for start, end in bounds), self.channels),
+            dtype=self.samples.dtype,
+        )
+        position = 0
+        for start, end in bounds:
+            output[position : position + end - start] = self.samples[start:end]
+            position += end - start
+        return AudioBuffer(output, self.frame_rate)
+
+    def convert(self, frame_rate, channels):
+        """
+        This audio at `frame_rate` and `channels`, resampled with soxr; the
+        same buffer when it already matches.
+        """
+        if (frame_rate, channels) == (self.frame_rate, self.channels):
+            return self
+        return AudioBuffer(
+            convert_samples(self.samples, self.frame_rate, frame_rate, channels),
+            frame_rate,
+        )
+
+    def export(self, output_path, output_format=None, quality=None):
+        """
+        Encodes the samples to `output_path` through utils.audio_encoding;
+        the format defaults to the file extension.
+        """
+        with pcm_encoder(
+            output_path, self.frame_rate, self.channels, output_format, quality
+        ) as write:
+            write(self.samples)
+        return output_path
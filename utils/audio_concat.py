@@ -0,0 +1,96 @@
+import logging
+import os
+import subprocess
+
+from utils.media_info import probe_media
+from utils.pcm_stream import pcm_encoder, stream_pcm
+from utils.resample import convert_stream, target_format
+
+# Audio codecs each output format can take as-is from the inputs
+STREAM_COPY_CODECS = {
+    "wav": ("pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_u8", "pcm_f32le"),
+    "mp3": ("mp3",),
+    "flac": ("flac",),
+    "ogg": ("vorbis", "opus"),
+    "opus": ("opus",),
+    "m4a": ("aac",),
+    "aac": ("aac",),
+}
+
+
+def stream_copy_possible(media_infos, output_format):
+    """
+    True when every input has the same codec, sample rate and channel count
+    and the output format can hold that codec without re-encoding.
+    """
+    parameters = {
+        (info.audio["codec_name"], info.audio["sample_rate"], info.audio["channels"])
+        for info in media_infos
+    }
+    if len(parameters) != 1:
+        return False
+    codec_name = next(iter(parameters))[0]
+    return codec_name in STREAM_COPY_CODECS.get(output_format, ())
+
+
+def _concat_stream_copy(input_paths, output_path):
+    concat_list_path = f"{output_path}.txt"
+    with open(concat_list_path, "w") as concat_list:
+        for input_path in input_paths:
+            concat_list.write(f"file '{os.path.abspath(input_path)}'\n")
+
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0"]
+    cmd += ["-i", concat_list_path, "-map", "0:a", "-c", "copy", output_path]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    finally:
+        os.remove(concat_list_path)
+
+
+def _concat_reencode(
+    media_infos, output_path, sample_rate, channels, output_format, quality
+):
+    with pcm_encoder(
+        output_path, sample_rate, channels, output_format, quality
+    ) as write:
+        # One chunk of PCM in flight at a time, whatever the total length.
+        # Each input is decoded as it is and converted once with soxr.
+        for info in media_infos:
+            source_rate = info.audio["sample_rate"]
+            source_channels = info.audio["channels"]
+            chunks = stream_pcm(info.path, source_rate, source_channels)
+            for samples in convert_stream(
+                chunks, source_rate, source_channels, sample_rate, channels
+            ):
+                write(samples)
+
+
+def concat_audio_files(input_paths, output_path, output_format, quality=None):
+    """
+    Joins `input_paths` end to end into `output_path`. Inputs with matching
+    codec parameters are stream-copied with the concat demuxer; otherwise
+    every input is decoded in chunks, converted to the highest sample rate
+    and channel count among them (as pydub would) and piped into a single
+    encoder.
+    """
+    media_infos = [probe_media(path) for path in input_paths]
+    for info in media_infos:
+        if not info.has_audio:
+            raise ValueError(f"No audio stream found in {info.path}.")
+
+    if stream_copy_possible(media_infos, output_format):
+        logging.info(f"[CONCAT_STREAM_COPY]: {len(input_paths)} inputs")
+        _concat_stream_copy(input_paths, output_path)
+    else:
+        sample_rate, channels = target_format(
+            (info.audio["sample_rate"], info.audio["channels"]) for info in media_infos
+        )
+        logging.info(
+            f"[CONCAT_REENCODE]: {len(input_paths)} inputs at "
+            f"{sample_rate} Hz, {channels} channels"
+        )
+        _concat_reencode(
+            media_infos, output_path, sample_rate, channels, output_format, quality
+        )
+
+    return output_path
@@ -0,0 +1,109 @@
+import logging
+import os
+import subprocess
+
+import numpy as np
+
+# Codecs whose frames can be spliced as-is, and the container they go into
+COMPRESSED_CUT_CODECS = {"mp3": "mp3", "aac": "m4a"}
+
+
+def can_cut_compressed(media_info):
+    return media_info.has_audio and (
+        media_info.audio["codec_name"] in COMPRESSED_CUT_CODECS
+    )
+
+
+def compressed_cut_extension(media_info):
+    return COMPRESSED_CUT_CODECS[media_info.audio["codec_name"]]
+
+
+def audio_packet_times(path, start_time=0.0):
+    """
+    Start times (seconds from the start of the file) of every packet of the
+    first audio stream. Each MP3/AAC packet is one codec frame, and every
+    one of them is a valid place to start or stop copying.
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "packet=pts_time",
+        "-of",
+        "csv=print_section=0",
+        path,
+    ]
+    result = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        logging.error(f"FFprobe stderr: {result.stderr}")
+        raise RuntimeError(f"ffprobe failed to index audio packets of {path}")
+
+    times = [
+        float(line) - start_time
+        for line in result.stdout.splitlines()
+        if line not in ("", "N/A")
+    ]
+    return np.unique(np.array(times, dtype=np.float64))
+
+
+def snap_ranges(ranges, packet_times, duration):
+    """
+    Widens every kept (start, end) range in seconds to whole codec frames:
+    the start moves back to the frame containing it and the end forward to
+    the next frame boundary. Ranges that now touch are joined.
+    """
+    boundaries = np.append(packet_times, duration)
+
+    snapped = []
+    for start, end in ranges:
+        first = max(np.searchsorted(boundaries, start, side="right") - 1, 0)
+        last = min(np.searchsorted(boundaries, end, side="left"), len(boundaries) - 1)
+        start, end = float(boundaries[first]), float(boundaries[last])
+        if end <= start:
+            continue
+        if snapped and start <= snapped[-1][1]:
+            snapped[-1][1] = max(snapped[-1][1], end)
+        else:
+            snapped.append([start, end])
+    return snapped
+
+
+def cut_compressed(input_path, nonsilent_ranges, output_path, media_info):
+    """
+    Keeps the merged `nonsilent_ranges` (ms) of an MP3/AAC input without
+    decoding it: each range is snapped outward to codec frame boundaries
+    and the original frames are spliced with the concat demuxer's
+    inpoint/outpoint and stream copy, in a single ffmpeg pass.
+    """
+    packet_times = audio_packet_times(input_path, media_info.start_time)
+    ranges = snap_ranges(
+        [(start / 1000, end / 1000) for start, end in nonsilent_ranges],
+        packet_times,
+        media_info.duration or float("inf"),
+    )
+
+    concat_list_path = f"{output_path}.txt"
+    with open(concat_list_path, "w") as concat_list:
+        for start, end in ranges:
+            concat_list.write(f"file '{os.path.abspath(input_path)}'\n")
+            concat_list.write(f"inpoint {start + media_info.start_time:.6f}\n")
+            if end != float("inf"):
+                concat_list.write(f"outpoint {end + media_info.start_time:.6f}\n")
+
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0"]
+    cmd += ["-i", concat_list_path, "-map", "0:a:0", "-c", "copy", output_path]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    finally:
+        os.remove(concat_list_path)
+
+    logging.info(
+        f"[AUDIO_CUT_COMPRESSED]: {len(ranges)} ranges, "
+        f"{media_info.audio['codec_name']} frames copied"
+    )
+    return output_path
@@ -0,0 +1,76 @@
+import os
+
+AUDIO_QUALITIES = ("low", "medium", "high")
+DEFAULT_AUDIO_QUALITY = os.environ.get("AUDIO_OUTPUT_QUALITY", "medium")
+
+
+def validate_audio_quality(quality):
+    if quality not in AUDIO_QUALITIES:
+        raise ValueError(
+            f"Invalid audio quality: {quality}. Expected one of {AUDIO_QUALITIES}."
+        )
+
+
+# A bad default would fail every encode, so refuse to start with one
+validate_audio_quality(DEFAULT_AUDIO_QUALITY)
+
+# Per output format: file extension, fixed encoder arguments and the extra
+# arguments for each quality level. FLAC is lossless, so its levels only
+# trade encode time for size.
+AUDIO_ENCODERS = {
+    "wav": ("wav", ["-c:a", "pcm_s16le"], {}),
+    "flac": (
+        "flac",
+        ["-c:a", "flac"],
+        {
+            "low": ["-compression_level", "0"],
+            "medium": ["-compression_level", "5"],
+            "high": ["-compression_level", "8"],
+        },
+    ),
+    "opus": (
+        "opus",
+        ["-c:a", "libopus", "-vbr", "on"],
+        {"low": ["-b:a", "48k"], "medium": ["-b:a", "96k"], "high": ["-b:a", "160k"]},
+    ),
+    "aac": (
+        "m4a",
+        ["-c:a", "aac", "-movflags", "+faststart"],
+        {"low": ["-b:a", "96k"], "medium": ["-b:a", "128k"], "high": ["-b:a", "256k"]},
+    ),
+    "mp3": (
+        "mp3",
+        ["-c:a", "libmp3lame"],
+        {"low": ["-q:a", "7"], "medium": ["-q:a", "4"], "high": ["-q:a", "0"]},
+    ),
+}
+AUDIO_ENCODERS["m4a"] = AUDIO_ENCODERS["aac"]
+
+
+def output_extension(output_format):
+    """
+    File extension for `output_format`; formats without settings here are
+    used as their own extension and left to ffmpeg's defaults.
+    """
+    if output_format in AUDIO_ENCODERS:
+        return AUDIO_ENCODERS[output_format][0]
+    return output_format
+
+
+def encoder_args(output_format, quality=None):
+    """
+    ffmpeg output arguments that encode audio as `output_format` at one of
+    AUDIO_QUALITIES (DEFAULT_AUDIO_QUALITY when not given).
+    """
+    if output_format not in AUDIO_ENCODERS:
+        return []
+
+    quality = quality or DEFAULT_AUDIO_QUALITY
+    validate_audio_quality(quality)
+
+    _, args, levels = AUDIO_ENCODERS[output_format]
+    return args + levels.get(quality, [])
+
+
+def format_from_path(path):
+    return os.path.splitext(path)[1].lstrip(".").lower()
@@ -1,31 +1,97 @@
-import subprocess
-import re
 import logging
+import numpy as np
 
+from utils.silence_detector import envelope_from_file
 
-def compute_silence_threshold(audio_path):
-    # Use FFmpeg to get the volume levels
-    cmd = f'ffmpeg -i {audio_path} -af "volumedetect" -f null /dev/null'
+# Per-frame loudness histogram: 1 dB bins from -100 dBFS up to full scale
+HISTOGRAM_FRAME_MS = 10
+HISTOGRAM_FLOOR_DB = -100.0
+HISTOGRAM_BIN_DB = 1.0
+
+
+def _power_to_db(power):
+    with np.errstate(divide="ignore"):
+        return 10 * np.log10(power)
 
-    # Redirect the FFmpeg output directly to a variable
-    process = subprocess.Popen(
-        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+
+class LoudnessStatistics:
+    """
+    Everything the threshold heuristics need, derived in one vectorised pass
+    over an already computed LoudnessEnvelope:
+
+    - `mean_volume`: whole-track level in dBFS (what volumedetect reports)
+    - `chunk_volumes`: mean level of every complete `chunk_duration` chunk
+    - `noise_floor`: mean level of the first `noise_duration` seconds
+    - `histogram`/`bin_edges`: distribution of 10 ms frame levels in dBFS
+    """
+
+    def __init__(self, envelope, chunk_duration=30, noise_duration=2.0):
+        weighted = envelope.power * envelope.counts
+        counts = envelope.counts
+
+        self.duration = len(envelope) / 1000
+        self.mean_volume = envelope.mean_volume()
+
+        chunk_ms = int(chunk_duration * 1000)
+        full_chunks = len(envelope) // chunk_ms
+        if full_chunks:
+            chunk_energy = weighted[: full_chunks * chunk_ms].reshape(full_chunks, -1)
+            chunk_counts = counts[: full_chunks * chunk_ms].reshape(full_chunks, -1)
+            self.chunk_volumes = _power_to_db(
+                chunk_energy.sum(axis=1) / np.maximum(chunk_counts.sum(axis=1), 1)
+            )
+        else:
+            self.chunk_volumes = np.zeros(0)
+
+        noise_ms = int(noise_duration * 1000)
+        self.noise_floor = float(
+            _power_to_db(weighted[:noise_ms].sum() / max(counts[:noise_ms].sum(), 1))
+        )
+
+        frame_count = len(envelope) // HISTOGRAM_FRAME_MS
+        usable = frame_count * HISTOGRAM_FRAME_MS
+        frame_power = weighted[:usable].reshape(frame_count, -1).sum(axis=1) / (
+            np.maximum(counts[:usable].reshape(frame_count, -1).sum(axis=1), 1)
+        )
+        frame_levels = np.clip(_power_to_db(frame_power), HISTOGRAM_FLOOR_DB, 0)
+
+        self.bin_edges = np.arange(
+            HISTOGRAM_FLOOR_DB, HISTOGRAM_BIN_DB, HISTOGRAM_BIN_DB
+        )
+        self.histogram, _ = np.histogram(frame_levels, bins=self.bin_edges)
+
+    def percentile(self, percent):
+        """
+        Frame level in dBFS below which `percent` of the 10 ms frames fall,
+        read from the histogram.
+        """
+        total = self.histogram.sum()
+        if not total:
+            return HISTOGRAM_FLOOR_DB
+
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, total * percent / 100.0))
+        return float(self.bin_edges[min(index + 1, len(self.bin_edges) - 1)])
+
+
+def compute_loudness_statistics(envelope, chunk_duration=30, noise_duration=2.0):
+    statistics = LoudnessStatistics(envelope, chunk_duration, noise_duration)
+    logging.info(
+        f"[LOUDNESS_STATISTICS]: mean {statistics.mean_volume:.1f} dB, "
+        f"noise floor {statistics.noise_floor:.1f} dB, "
+        f"{len(statistics.chunk_volumes)} chunks"
     )
-    output, _ = process.communicate()
-    output = output.decode("utf-8")
-
-    # Modify the regex to be more lenient
-    mean_volume_match = re.search(r"mean_volume:\s*(-?\d+\.?\d*)\s*dB", output)
-    if mean_volume_match:
-        mean_volume = float(mean_volume_match.group(1))
-    else:
-        logging.error(
-            f"FFmpeg output: {output}"
-        )  # Log the entire FFmpeg output for debugging
-        raise ValueError("Unable to extract mean volume from FFmpeg output.")
-
-    # Set the silence threshold to be slightly above the mean volume (e.g., 5 dB more)
-    silence_threshold = mean_volume - 8
+    return statistics
+
+
+def compute_silence_threshold(audio_path):
+    statistics = compute_loudness_statistics(envelope_from_file(audio_path))
+    return silence_threshold_from_statistics(statistics)
+
+
+def silence_threshold_from_statistics(statistics):
+    # Set the silence threshold to be slightly below the mean volume
+    silence_threshold = statistics.mean_volume - 8
 
     logging.info(f"Computed silence threshold: {silence_threshold}")
 
@@ -37,62 +103,48 @@ def compute_dynamic_silence_threshold(audio_path, chunk_duration=30):
     Computes a dynamic silence threshold based on chunks of the audio.
     Also takes into consideration the noise floor at the beginning of the audio.
     """
-    # Get the total duration of the audio
-    audio_duration_cmd = (
-        f'ffprobe -i {audio_path} -show_format -v quiet | sed -n "s/duration=//p"'
+    statistics = compute_loudness_statistics(
+        envelope_from_file(audio_path), chunk_duration=chunk_duration
     )
-    audio_duration = float(subprocess.getoutput(audio_duration_cmd).strip())
+    return dynamic_silence_threshold_from_statistics(statistics)
 
-    # Estimate noise floor from the beginning
-    noise_duration = 2.0  # seconds
-    cmd_noise = f'ffmpeg -i {audio_path} -t {noise_duration} -af "volumedetect" -f null /dev/null'
-    process_noise = subprocess.Popen(
-        cmd_noise, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-    )
-    output_noise, _ = process_noise.communicate()
-    output_noise = output_noise.decode("utf-8")
-    mean_volume_noise_match = re.search(
-        r"mean_volume:\s*(-?\d+\.?\d*)\s*dB", output_noise
+
+def dynamic_silence_threshold_from_statistics(statistics):
+    # Silent chunks have no usable level; fall back to the noise floor there
+    thresholds = np.where(
+        np.isfinite(statistics.chunk_volumes),
+        statistics.chunk_volumes - 5,
+        statistics.noise_floor - 5,
     )
-    if mean_volume_noise_match:
-        mean_volume_noise = float(mean_volume_noise_match.group(1))
-    else:
-        logging.error(f"FFmpeg output: {output_noise}")
-        raise ValueError(
-            "Unable to extract mean volume from FFmpeg output for noise estimation."
-        )
 
-    thresholds = []
+    # Return the average threshold across chunks
+    if len(thresholds):
+        return float(thresholds.mean())
+    return statistics.noise_floor - 5
 
-    # Segment the audio into chunks and compute threshold for each chunk
-    num_chunks = int(audio_duration // chunk_duration)
-    for i in range(num_chunks):
-        start_time = i * chunk_duration
-        end_time = (i + 1) * chunk_duration
-        cmd_chunk = f'ffmpeg -i {audio_path} -ss {start_time} -to {end_time} -af "volumedetect" -f null /dev/null'
-        process_chunk = subprocess.Popen(
-            cmd_chunk, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-        )
-        output_chunk, _ = process_chunk.communicate()
-        output_chunk = output_chunk.decode("utf-8")
-        mean_volume_chunk_match = re.search(
-            r"mean_volume:\s*(-?\d+\.?\d*)\s*dB", output_chunk
-        )
-        if mean_volume_chunk_match:
-            mean_volume_chunk = float(mean_volume_chunk_match.group(1))
-            thresholds.append(
-                mean_volume_chunk - 5
-            )  # Adjust this value based on testing
-        else:
-            thresholds.append(
-                mean_volume_noise - 5
-            )  # Use noise floor estimation if chunk volume not found
 
-    # Return the average threshold across chunks
-    return sum(thresholds) / len(thresholds) if thresholds else mean_volume_noise - 5
+def adaptive_silence_threshold(statistics, percentile=20, margin=4):
+    """
+    Picks the threshold from the frame-level histogram: a little above the
+    level of the quietest `percentile` of frames (pauses and room tone), but
+    never above the median frame, which is speech in any usable recording.
+    """
+    quiet_level = statistics.percentile(percentile)
+    speech_level = statistics.percentile(50)
+    silence_threshold = min(quiet_level + margin, speech_level)
 
+    logging.info(f"Computed adaptive silence threshold: {silence_threshold}")
+
+    return silence_threshold
 
-# Replace the call to compute_silence_threshold in remove_silence function with compute_dynamic_silence_threshold
-# silence_threshold = compute_dynamic_silence_threshold(audio_file)
 
-# Note: The user feedback and fine-tuning would require additional frontend/backend mechanisms and are not implemented here.
+def adaptive_silence_thresholds(envelope):
+    """
+    Candidate thresholds derived from the envelope, in the order they should
+    be tried after the requested one.
+    """
+    statistics = compute_loudness_statistics(envelope)
+    return [
+        silence_threshold_from_statistics(statistics),
+        adaptive_silence_threshold(statistics),
+    ]
@@ -0,0 +1,97 @@
+import numpy as np
+
+from utils.silence_detector import frame_boundaries
+
+DUCK_ATTACK_MS = 50
+DUCK_RELEASE_MS = 500
+
+
+def speech_activity(nonsilent_ranges, duration_ms):
+    """
+    Boolean per-millisecond mask of the (start, end) speech sections.
+    """
+    edges = np.zeros(duration_ms + 1, dtype=np.int32)
+    for start, end in nonsilent_ranges:
+        start, end = max(int(start), 0), min(int(end), duration_ms)
+        if start < end:
+            edges[start] += 1
+            edges[end] -= 1
+    return np.cumsum(edges[:-1]) > 0
+
+
+def ducking_amount(active, attack_ms=DUCK_ATTACK_MS, release_ms=DUCK_RELEASE_MS):
+    """
+    Per-millisecond ducking amount in [0, 1]: 1 during speech, ramping in
+    linearly over `attack_ms` before each section and back out over
+    `release_ms` after it.
+    """
+    positions = np.arange(len(active))
+    amount = active.astype(np.float32)
+    if not active.any():
+        return amount
+
+    starts = np.flatnonzero(active & ~np.concatenate(([False], active[:-1])))
+    ends = np.flatnonzero(active & ~np.concatenate((active[1:], [False]))) + 1
+
+    # Time since the latest section end and until the next section start
+    latest_end = np.full(len(active), -1, dtype=np.int64)
+    latest_end[ends[ends < len(active)]] = ends[ends < len(active)]
+    latest_end = np.maximum.accumulate(latest_end)
+
+    next_start = np.full(len(active), len(active) * 2, dtype=np.int64)
+    next_start[starts] = starts
+    next_start = np.minimum.accumulate(next_start[::-1])[::-1]
+
+    if release_ms > 0:
+        release = 1 - (positions - latest_end) / release_ms
+        np.maximum(amount, np.where(latest_end >= 0, release, 0), out=amount)
+    if attack_ms > 0:
+        attack = 1 - (next_start - positions) / attack_ms
+        np.maximum(amount, attack, out=amount)
+
+    return np.clip(amount, 0, 1, out=amount)
+
+
+def duck_gain_curve(
+    nonsilent_ranges,
+    frame_count,
+    frame_rate,
+    background_gain_db=-20,
+    duck_gain_db=-10,
+    attack_ms=DUCK_ATTACK_MS,
+    release_ms=DUCK_RELEASE_MS,
+):
+    """
+    Per-frame linear gain for the background: `background_gain_db` normally,
+    a further `duck_gain_db` under speech, with attack/release ramps.
+    """
+    duration_ms = int(np.ceil(1000 * frame_count / frame_rate))
+    amount = ducking_amount(
+        speech_activity(nonsilent_ranges, duration_ms), attack_ms, release_ms
+    )
+
+    base = 10 ** (background_gain_db / 20)
+    ducked = 10 ** ((background_gain_db + duck_gain_db) / 20)
+    gain_ms = (base + amount * (ducked - base)).astype(np.float32)
+
+    # Expand to frames with the same ms -> frame rounding used everywhere else
+    counts = np.diff(frame_boundaries(duration_ms, frame_rate))
+    return np.repeat(gain_ms, counts)[:frame_count]
+
+
+def mix_ducked(main, background, gain):
+    """
+    main + background * gain, with `background` ((frames, channels)) tiled
+    to the length of `main` without materialising the repeats. Returns int16.
+    """
+    output = main.astype(np.float32)
+    gain = gain[:, None]
+    length = len(background)
+
+    if length:
+        for start in range(0, len(output), length):
+            end = min(start + length, len(output))
+            output[start:end] += background[: end - start] * gain[start:end]
+
+    np.clip(output, -32768, 32767, out=output)
+    return output.astype(np.int16)
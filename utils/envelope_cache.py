@@ -0,0 +1,225 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.silence_detector import (
+    LoudnessEnvelope,
+    compute_energy_envelope,
+    frame_boundaries,
+)
+
+load_dotenv()
+
+# Bump when the envelope computation changes so stale entries are ignored
+ENVELOPE_CACHE_VERSION = 3
+
+ENVELOPE_CACHE_DIR = os.environ.get("ENVELOPE_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "envelope_cache"
+)
+ENVELOPE_CACHE_MAX_BYTES = int(os.environ.get("ENVELOPE_CACHE_MAX_BYTES", 2 * 1024**3))
+ENVELOPE_CACHE_REDIS_URL = os.environ.get("ENVELOPE_CACHE_REDIS_URL")
+ENVELOPE_CACHE_TTL = int(os.environ.get("ENVELOPE_CACHE_TTL", 7 * 86400))
+
+_redis_client = None
+_hash_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def _hash_file(f, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EnvelopeCacheKey:
+    """
+    Cache key for one media file. The content hash runs on a background
+    thread from the moment the key is made, so on a miss it overlaps the
+    audio decode instead of delaying it. The file size is part of the key,
+    which lets a lookup with no same-sized entry on disk (and no Redis)
+    report a miss without waiting for the hash at all.
+    """
+
+    def __init__(self, path, variant):
+        self.prefix = (
+            f"envelope:v{ENVELOPE_CACHE_VERSION}:{variant}:{os.path.getsize(path)}"
+        )
+        # Opened here so a later rename or removal of `path` can't race the hash
+        self._hash = _hash_executor.submit(_hash_file, open(path, "rb"))
+
+    def __str__(self):
+        return f"{self.prefix}:{self._hash.result()}"
+
+
+def envelope_cache_key(path, variant):
+    """
+    `variant` describes how the audio was decoded (e.g. "video:denoised"),
+    since the same file analysed two ways gives two different envelopes.
+    """
+    return EnvelopeCacheKey(path, variant)
+
+
+def serialize_envelope(envelope, frame_rate, channels):
+    # float32 is ample for dBFS comparisons and, compressed, takes well under
+    # half the space of the float64 array on disk and in Redis
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        power=envelope.power.astype(np.float32),
+        frame_rate=frame_rate,
+        channels=channels,
+        max_amplitude=envelope.max_amplitude or 0,
+    )
+    return buffer.getvalue()
+
+
+def deserialize_envelope(data):
+    with np.load(io.BytesIO(data)) as stored:
+        power = stored["power"].astype(np.float64)
+        frame_rate = int(stored["frame_rate"])
+        channels = int(stored["channels"])
+        max_amplitude = int(stored["max_amplitude"]) or None
+
+    counts = np.diff(frame_boundaries(len(power), frame_rate)) * channels
+    return LoudnessEnvelope(power, counts, max_amplitude)
+
+
+def _disk_path(key):
+    return os.path.join(ENVELOPE_CACHE_DIR, f"{str(key).replace(':', '_')}.npz")
+
+
+def _may_be_cached(key):
+    # Without Redis, only a disk entry for a file of the same size can match
+    if ENVELOPE_CACHE_REDIS_URL:
+        return True
+    prefix = os.path.basename(_disk_path(key.prefix))[: -len(".npz")] + "_"
+    try:
+        return any(name.startswith(prefix) for name in os.listdir(ENVELOPE_CACHE_DIR))
+    except FileNotFoundError:
+        return False
+
+
+def _evict_disk_entries():
+    entries = []
+    for name in os.listdir(ENVELOPE_CACHE_DIR):
+        if not name.endswith(".npz"):
+            continue
+        path = os.path.join(ENVELOPE_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= ENVELOPE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            logging.info(f"[ENVELOPE_CACHE_EVICTED]: {os.path.basename(path)}")
+        except FileNotFoundError:
+            pass
+
+
+def _get_redis():
+    global _redis_client
+    if not ENVELOPE_CACHE_REDIS_URL:
+        return None
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(ENVELOPE_CACHE_REDIS_URL)
+    return _redis_client
+
+
+def load_envelope(key):
+    """
+    Looks the envelope up on local disk, then in Redis. Returns None on a
+    miss; cache failures are logged and treated as misses.
+    """
+    if not _may_be_cached(key):
+        logging.info(f"[ENVELOPE_CACHE_MISS]: {key.prefix}")
+        return None
+
+    key = str(key)
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # Touch the entry so eviction is least-recently-used
+        os.utime(path)
+        logging.info(f"[ENVELOPE_CACHE_HIT_DISK]: {key}")
+        return deserialize_envelope(data)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Failed to read envelope cache entry {key}. Error: {str(e)}")
+
+    try:
+        client = _get_redis()
+        data = client.get(key) if client else None
+        if data:
+            logging.info(f"[ENVELOPE_CACHE_HIT_REDIS]: {key}")
+            _write_disk(key, data)
+            return deserialize_envelope(data)
+    except Exception as e:
+        logging.warning(f"Failed to read envelope from Redis. Error: {str(e)}")
+
+    logging.info(f"[ENVELOPE_CACHE_MISS]: {key}")
+    return None
+
+
+def _write_disk(key, data):
+    os.makedirs(ENVELOPE_CACHE_DIR, exist_ok=True)
+    path = _disk_path(key)
+
+    # Write then rename, so concurrent workers never read a partial entry
+    temp_path = f"{path}.{uuid4()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+    _evict_disk_entries()
+
+
+def store_envelope(key, envelope, frame_rate, channels):
+    key = str(key)
+    data = serialize_envelope(envelope, frame_rate, channels)
+
+    try:
+        _write_disk(key, data)
+    except Exception as e:
+        logging.warning(f"Failed to write envelope cache entry {key}. Error: {str(e)}")
+
+    try:
+        client = _get_redis()
+        if client:
+            client.set(key, data, ex=ENVELOPE_CACHE_TTL)
+    except Exception as e:
+        logging.warning(f"Failed to write envelope to Redis. Error: {str(e)}")
+
+    logging.info(f"[ENVELOPE_CACHED]: {key} ({len(data)} bytes)")
+
+
+def cached_pcm_envelope(key, decode):
+    """
+    Returns the cached envelope for `key`, or calls `decode()` for a
+    (frames, channels) int16 array and its sample rate, analyses it and
+    caches the result.
+    """
+    envelope = load_envelope(key)
+    if envelope is None:
+        samples, frame_rate = decode()
+        envelope = compute_energy_envelope(samples, frame_rate, 32768)
+        store_envelope(key, envelope, frame_rate, samples.shape[1])
+    return envelope
@@ -3,21 +3,82 @@ import os
 import logging
 from uuid import uuid4
 
+from utils.media_info import probe_media
 
-def detect_problematic_video(video_path):
-    video_info = ffmpeg.probe(video_path)
-    codec_name = video_info["streams"][0]["codec_name"]
-    if codec_name in ["some_problematic_codec"]:
+STANDARD_CONTAINERS = ("mov,mp4,m4a,3gp,3g2,mj2",)
+STANDARD_VIDEO_CODECS = ("h264",)
+STANDARD_PIX_FMTS = ("yuv420p", "yuvj420p")
+STANDARD_AUDIO_CODECS = ("aac",)
+
+# What convert_to_standard_format has to do to a file, cheapest first
+CONVERSION_NONE = "none"
+CONVERSION_REMUX = "remux"
+CONVERSION_AUDIO = "audio"
+CONVERSION_FULL = "full"
+
+
+def detect_problematic_video(media_info):
+    """
+    True when the video stream has to be re-encoded before moviepy and the
+    renderers can rely on it: a codec other than H.264, a pixel format other
+    than 8-bit 4:2:0, or odd dimensions that libx264 cannot cut to.
+    """
+    video = media_info.video
+    if video is None:
+        return True
+    if video["codec_name"] not in STANDARD_VIDEO_CODECS:
+        return True
+    if video["pix_fmt"] not in STANDARD_PIX_FMTS:
+        return True
+    if (video["width"] or 0) % 2 or (video["height"] or 0) % 2:
         return True
     return False
 
 
-def convert_to_standard_format(video_path, output_dir):
-    logging.info(f"[CONVERTING_VIDEO]")
+def conversion_plan(media_info):
+    if detect_problematic_video(media_info):
+        return CONVERSION_FULL
+    if media_info.has_audio and (
+        media_info.audio["codec_name"] not in STANDARD_AUDIO_CODECS
+    ):
+        return CONVERSION_AUDIO
+    if media_info.format_name not in STANDARD_CONTAINERS:
+        return CONVERSION_REMUX
+    return CONVERSION_NONE
+
+
+def convert_to_standard_format(video_path, output_dir, media_info=None):
+    """
+    Brings the input to an H.264/AAC MP4, doing only as much work as the
+    probe says is needed. Returns the (possibly unchanged) path and the
+    MediaInfo describing it.
+    """
+    media_info = media_info or probe_media(video_path)
+    plan = conversion_plan(media_info)
+    logging.info(f"[CONVERTING_VIDEO]: {plan}")
+
+    if plan == CONVERSION_NONE:
+        return video_path, media_info
+
     random_id = str(uuid4())
     converted_video_path = os.path.join(output_dir, f"converted_video_{random_id}.mp4")
-    ffmpeg.input(video_path).output(
-        converted_video_path, vcodec="libx264", acodec="aac", vf="scale=-1:-1"
-    ).global_args("-loglevel", "error").run()
 
-    return converted_video_path
+    if plan == CONVERSION_FULL:
+        output_args = {"vcodec": "libx264", "acodec": "aac", "vf": "scale=-1:-1"}
+    elif plan == CONVERSION_AUDIO:
+        output_args = {"vcodec": "copy", "acodec": "aac"}
+    else:
+        output_args = {"c": "copy"}
+
+    ffmpeg.input(video_path).output(converted_video_path, **output_args).global_args(
+        "-loglevel", "error"
+    ).run()
+
+    # Copied streams keep their parameters; only re-encoded ones need a probe
+    if plan == CONVERSION_REMUX:
+        media_info.path = converted_video_path
+        media_info.format_name = STANDARD_CONTAINERS[0]
+    else:
+        media_info = probe_media(converted_video_path)
+
+    return converted_video_path, media_info
@@ -0,0 +1,164 @@
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Parallel Range requests per download and the size each one fetches
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+DOWNLOAD_PART_BYTES = int(os.environ.get("DOWNLOAD_PART_BYTES", 32 * 1024 * 1024))
+# Read/write buffer size
+DOWNLOAD_CHUNK_BYTES = int(os.environ.get("DOWNLOAD_CHUNK_BYTES", 1024 * 1024))
+# Attempts per part; each one resumes from the last byte written
+DOWNLOAD_PART_ATTEMPTS = int(os.environ.get("DOWNLOAD_PART_ATTEMPTS", 3))
+DOWNLOAD_TIMEOUT = (10, 60)  # connect, read (seconds)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    The worker's pooled keep-alive session, created on first use so every
+    forked worker process gets its own connection pool.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            # Byte ranges and the size check count bytes as stored, so ask
+            # servers not to compress them in transit
+            _session.headers["Accept-Encoding"] = "identity"
+            adapter = HTTPAdapter(
+                pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS * 2
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def probe(session, url):
+    """
+    Asks for the first byte and returns `(total_size, headers, response)`.
+    A server that ignores Range answers 200 with the whole body, which comes
+    back as `response` to be streamed as-is; otherwise `response` is None.
+    """
+    response = session.get(
+        url, headers={"Range": "bytes=0-0"}, stream=True, timeout=DOWNLOAD_TIMEOUT
+    )
+    if response.status_code == 416:
+        # Nothing to range over in an empty file
+        response.close()
+        response = session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+
+    match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+    if response.status_code == 206 and match:
+        response.close()
+        return int(match.group(1)), response.headers, None
+
+    length = response.headers.get("Content-Length")
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        # requests decodes the body, so its length won't match the header
+        length = None
+    return (int(length) if length else None), response.headers, response
+
+
+def _write_body(response, file):
+    written = 0
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+        file.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def _fetch_part(session, url, dest_path, start, end):
+    """
+    Writes bytes start..end (inclusive) of `url` at the same offsets of the
+    preallocated `dest_path`. After a failure the next attempt asks only for
+    what is still missing.
+    """
+    offset = start
+    for attempt in range(DOWNLOAD_PART_ATTEMPTS):
+        try:
+            with session.get(
+                url,
+                headers={"Range": f"bytes={offset}-{end}"},
+                stream=True,
+                timeout=DOWNLOAD_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise requests.RequestException(
+                        f"Expected a partial response, got {response.status_code}"
+                    )
+                with open(dest_path, "r+b") as file:
+                    file.seek(offset)
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                        chunk = chunk[: end + 1 - offset]
+                        file.write(chunk)
+                        offset += len(chunk)
+                        if offset > end:
+                            break
+
+            if offset > end:
+                return end + 1 - start
+            raise requests.RequestException(
+                f"Connection closed at byte {offset} of part {start}-{end}"
+            )
+        except requests.RequestException as e:
+            if attempt == DOWNLOAD_PART_ATTEMPTS - 1:
+                raise
+            logging.warning(
+                f"[DOWNLOAD_PART_RESUMING]: {start}-{end} from {offset}. Error: {e}"
+            )
+            time.sleep(2**attempt)
+
+
+def download(url, dest_path, workers=None, session=None, probed=None):
+    """
+    Downloads `url` to `dest_path`. Servers that honour Range get the file
+    as parallel DOWNLOAD_PART_BYTES requests written straight into a
+    preallocated file, each resumed from its last good byte after a
+    failure; others are streamed in one request. The final size is checked
+    against the server's. `probed` is a `probe()` result to reuse. Returns
+    the number of bytes written.
+    """
+    workers = workers or DOWNLOAD_WORKERS
+    session = session or get_session()
+
+    size, _, response = probed or probe(session, url)
+
+    if response is not None:
+        # No Range support: one plain stream, so nothing to resume from
+        with response, open(dest_path, "wb") as file:
+            written = _write_body(response, file)
+        parts = 1
+    else:
+        with open(dest_path, "wb") as file:
+            file.truncate(size)
+
+        bounds = [
+            (start, min(start + DOWNLOAD_PART_BYTES, size) - 1)
+            for start in range(0, size, DOWNLOAD_PART_BYTES)
+        ]
+        parts = len(bounds)
+        with ThreadPoolExecutor(max_workers=min(workers, max(parts, 1))) as executor:
+            written = sum(
+                executor.map(
+                    lambda part: _fetch_part(session, url, dest_path, *part), bounds
+                )
+            )
+
+    actual = os.path.getsize(dest_path)
+    if (size is not None and written != size) or actual != written:
+        raise requests.RequestException(
+            f"Downloaded {written} bytes ({actual} on disk) of {size} from {url}"
+        )
+
+    logging.info(f"[HTTP_DOWNLOAD_DONE]: {written} bytes in {parts} parts")
+    return written
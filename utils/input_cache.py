@@ -0,0 +1,299 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+from utils.http_download import download, get_session, probe
+
+load_dotenv()
+
+INPUT_CACHE_DIR = os.environ.get("INPUT_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "input_cache"
+)
+# 0 turns the cache off
+INPUT_CACHE_MAX_BYTES = int(os.environ.get("INPUT_CACHE_MAX_BYTES", 20 * 1024**3))
+
+# Query parameters that only sign the request, so the same object fetched
+# through two presigned URLs still maps to one entry
+SIGNING_PARAMS = (
+    "x-amz-",
+    "awsaccesskeyid",
+    "signature",
+    "expires",
+    "x-goog-",
+    "googleaccessid",
+    "se",
+    "sig",
+    "sp",
+    "sv",
+    "st",
+)
+
+STATS_FILE = "stats.json"
+
+
+def _is_signing_param(name):
+    name = name.lower()
+    return any(
+        name.startswith(param) if param.endswith("-") else name == param
+        for param in SIGNING_PARAMS
+    )
+
+
+def input_cache_key(url, headers):
+    """
+    The entry for `url` as the server currently describes it: the URL minus
+    its signature plus the ETag (or Last-Modified). Returns None when the
+    server gives neither, since a changed file could not be told apart.
+    """
+    validator = headers.get("ETag") or headers.get("Last-Modified")
+    if not validator:
+        return None
+
+    parts = urlsplit(url)
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_signing_param(name)
+    ]
+    resource = urlunsplit(parts._replace(query=urlencode(query), fragment=""))
+    return hashlib.sha256(f"{resource}\n{validator}".encode()).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(INPUT_CACHE_DIR, f"{key}.input")
+
+
+@contextmanager
+def _locked(path, blocking=True):
+    """
+    Holds an exclusive flock on the lock file `path` and yields True, or
+    yields False straight away when `blocking` is off and another process
+    holds it. flock is released when the file closes, including when a
+    worker dies.
+    """
+    while True:
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            yield False
+            return
+
+        # The sweep removes lock files it holds; whoever was waiting on the
+        # removed one locks the current file instead
+        try:
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    try:
+        yield True
+    finally:
+        lock_file.close()
+
+
+def _record(**counts):
+    """
+    Adds `counts` to the stats shared by every worker process on this host.
+    """
+    stats_path = os.path.join(INPUT_CACHE_DIR, STATS_FILE)
+    try:
+        with _locked(f"{stats_path}.lock"):
+            try:
+                with open(stats_path) as f:
+                    stats = json.load(f)
+            except (FileNotFoundError, ValueError):
+                stats = {}
+            for name, count in counts.items():
+                stats[name] = stats.get(name, 0) + count
+
+            temp_path = f"{stats_path}.{uuid4()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(stats, f)
+            os.replace(temp_path, stats_path)
+        return stats
+    except Exception as e:
+        logging.warning(f"Failed to update input cache stats. Error: {str(e)}")
+        return {}
+
+
+def input_cache_stats():
+    """
+    Hit/miss counters for this host's cache with its current size, for
+    tuning INPUT_CACHE_MAX_BYTES.
+    """
+    try:
+        with open(os.path.join(INPUT_CACHE_DIR, STATS_FILE)) as f:
+            stats = json.load(f)
+    except (FileNotFoundError, ValueError):
+        stats = {}
+
+    entries = _list_entries()
+    for name in ("hits", "misses", "uncacheable", "hit_bytes", "miss_bytes"):
+        stats.setdefault(name, 0)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["entries"] = len(entries)
+    stats["size_bytes"] = sum(size for _, size, _ in entries)
+    stats["max_bytes"] = INPUT_CACHE_MAX_BYTES
+    return stats
+
+
+def _list_entries():
+    entries = []
+    try:
+        names = os.listdir(INPUT_CACHE_DIR)
+    except FileNotFoundError:
+        return entries
+    for name in names:
+        if not name.endswith(".input"):
+            continue
+        path = os.path.join(INPUT_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict_entries():
+    """
+    Removes least-recently-used entries until the cache fits its budget.
+    Each one is removed under its lock, skipping entries another process
+    is filling or handing out right now, and its lock file goes with it.
+    """
+    entries = _list_entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= INPUT_CACHE_MAX_BYTES:
+            break
+        with _locked(f"{path}.lock", blocking=False) as acquired:
+            if not acquired:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                logging.info(f"[INPUT_CACHE_EVICTED]: {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
+            os.remove(f"{path}.lock")
+
+
+def _sweep_orphans():
+    """
+    Removes temp files left by processes that died mid-write and lock files
+    whose entry is gone. Both are only written or used under their lock, so
+    one that can be locked right now has no live owner.
+    """
+    for name in os.listdir(INPUT_CACHE_DIR):
+        if name.endswith(".tmp"):
+            # "<target>.<uuid>.tmp", written under "<target>.lock"
+            target = os.path.join(INPUT_CACHE_DIR, name.rsplit(".", 2)[0])
+            orphan = os.path.join(INPUT_CACHE_DIR, name)
+        elif name.endswith(".lock"):
+            target = os.path.join(INPUT_CACHE_DIR, name[: -len(".lock")])
+            orphan = None
+        else:
+            continue
+
+        with _locked(f"{target}.lock", blocking=False) as acquired:
+            if not acquired:
+                continue
+            if orphan is not None:
+                if os.path.exists(orphan):
+                    os.remove(orphan)
+                    logging.info(f"[INPUT_CACHE_ORPHAN_REMOVED]: {name}")
+            elif not os.path.exists(target):
+                os.remove(f"{target}.lock")
+
+
+def _deliver(entry_path, dest_path):
+    """
+    Hard-links the entry to `dest_path`, so a hit costs no copy; evicting
+    the entry later leaves the task's link intact. Falls back to copying
+    across filesystems.
+    """
+    try:
+        os.link(entry_path, dest_path)
+    except OSError:
+        shutil.copyfile(entry_path, dest_path)
+
+
+def cached_download(url, dest_path, session=None):
+    """
+    download() through the worker's input cache. The Range probe download()
+    needs anyway supplies the ETag/Last-Modified for the key. Fills happen
+    under a per-entry lock, so concurrent processes asking for the same
+    input wait for one download instead of each fetching it, and land by
+    rename so no reader sees a partial file. Returns the input's size.
+    """
+    session = session or get_session()
+    # Never write through a link left by an earlier hit on this path
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+
+    probed = probe(session, url)
+    size, headers, response = probed
+
+    if INPUT_CACHE_MAX_BYTES <= 0:
+        return download(url, dest_path, session=session, probed=probed)
+
+    os.makedirs(INPUT_CACHE_DIR, exist_ok=True)
+    key = input_cache_key(url, headers)
+    if key is None:
+        _record(uncacheable=1)
+        return download(url, dest_path, session=session, probed=probed)
+
+    entry_path = _entry_path(key)
+
+    with _locked(f"{entry_path}.lock"):
+        if os.path.exists(entry_path) and (
+            size is None or os.path.getsize(entry_path) == size
+        ):
+            if response is not None:
+                response.close()
+            # Touch the entry so eviction is least-recently-used
+            os.utime(entry_path)
+            _deliver(entry_path, dest_path)
+            written = os.path.getsize(entry_path)
+            stats = _record(hits=1, hit_bytes=written)
+            logging.info(
+                f"[INPUT_CACHE_HIT]: {key} ({written} bytes, "
+                f"{stats.get('hits', 0)} hits / {stats.get('misses', 0)} misses)"
+            )
+            return written
+
+        temp_path = f"{entry_path}.{uuid4()}.tmp"
+        try:
+            written = download(url, temp_path, session=session, probed=probed)
+            os.replace(temp_path, entry_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        _deliver(entry_path, dest_path)
+
+    stats = _record(misses=1, miss_bytes=written)
+    logging.info(
+        f"[INPUT_CACHE_MISS]: {key} ({written} bytes, "
+        f"{stats.get('hits', 0)} hits / {stats.get('misses', 0)} misses)"
+    )
+
+    try:
+        _evict_entries()
+        _sweep_orphans()
+    except Exception as e:
+        logging.warning(f"Failed to evict input cache entries. Error: {str(e)}")
+    return written
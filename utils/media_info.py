@@ -0,0 +1,102 @@
+import json
+import logging
+import subprocess
+
+
+def _parse_rate(rate):
+    try:
+        num, den = (int(part) for part in rate.split("/"))
+        return num / den if den else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MediaInfo:
+    """
+    Container, video and audio stream parameters of one file, read from a
+    single ffprobe JSON call. `video` and `audio` are None when the file has
+    no such stream.
+    """
+
+    def __init__(self, path, probe):
+        self.path = path
+
+        media_format = probe.get("format", {})
+        self.format_name = media_format.get("format_name", "")
+        self.duration = _parse_float(media_format.get("duration"))
+        self.start_time = _parse_float(media_format.get("start_time")) or 0.0
+        self.bit_rate = media_format.get("bit_rate")
+
+        streams = probe.get("streams", [])
+        video = next((s for s in streams if s.get("codec_type") == "video"), None)
+        audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+        self.video = None
+        if video:
+            self.video = {
+                "codec_name": video.get("codec_name"),
+                "profile": video.get("profile"),
+                "level": video.get("level"),
+                "pix_fmt": video.get("pix_fmt"),
+                "width": video.get("width"),
+                "height": video.get("height"),
+                "frame_rate": _parse_rate(video.get("avg_frame_rate")),
+                "bit_rate": video.get("bit_rate") or self.bit_rate,
+            }
+
+        self.audio = None
+        if audio:
+            self.audio = {
+                "codec_name": audio.get("codec_name"),
+                "sample_rate": int(audio.get("sample_rate") or 0),
+                "channels": int(audio.get("channels") or 0),
+                "bit_rate": audio.get("bit_rate"),
+            }
+
+    @property
+    def has_video(self):
+        return self.video is not None
+
+    @property
+    def has_audio(self):
+        return self.audio is not None
+
+    def __repr__(self):
+        video = self.video["codec_name"] if self.video else None
+        audio = self.audio["codec_name"] if self.audio else None
+        return f"MediaInfo({self.format_name}, video={video}, audio={audio})"
+
+
+def probe_media(path):
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_format",
+        "-show_streams",
+        "-of",
+        "json",
+        path,
+    ]
+    result = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+    try:
+        probe = json.loads(result.stdout)
+    except ValueError:
+        probe = None
+    if result.returncode != 0 or not probe or not probe.get("streams"):
+        logging.error(f"FFprobe stderr: {result.stderr}")
+        raise ValueError(f"Failed to probe media file {path}.")
+
+    media_info = MediaInfo(path, probe)
+    logging.info(f"[MEDIA_INFO]: {media_info}")
+    return media_info
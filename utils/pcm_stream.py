@@ -0,0 +1,137 @@
+import json
+import logging
+import subprocess
+from contextlib import contextmanager
+import numpy as np
+
+from utils.audio_encoding import encoder_args, format_from_path
+
+PCM_CHUNK_MS = 10000
+
+# Mono 16 kHz is plenty for energy-based silence detection
+ANALYSIS_SAMPLE_RATE = 16000
+ANALYSIS_CHANNELS = 1
+
+
+def probe_audio_format(path):
+    """
+    Returns (sample_rate, channels) of the first audio stream using ffprobe.
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=sample_rate,channels",
+        "-of",
+        "json",
+        path,
+    ]
+    result = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+    try:
+        stream = json.loads(result.stdout)["streams"][0]
+        return int(stream["sample_rate"]), int(stream["channels"])
+    except (ValueError, KeyError, IndexError):
+        logging.error(f"FFprobe stderr: {result.stderr}")
+        raise ValueError(f"No audio stream found in {path}.")
+
+
+def stream_pcm(path, sample_rate, channels, chunk_ms=PCM_CHUNK_MS):
+    """
+    Decodes `path` through an ffmpeg pipe and yields (frames, channels) int16
+    arrays of at most `chunk_ms` milliseconds each.
+    """
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        path,
+        "-vn",
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        str(channels),
+        "-",
+    ]
+    frame_bytes = 2 * channels
+    chunk_bytes = max(int(sample_rate * chunk_ms / 1000), 1) * frame_bytes
+
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=chunk_bytes
+    )
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % frame_bytes
+            yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, channels)
+        process.wait()
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            # The consumer stopped early; don't leave ffmpeg blocked on a pipe
+            process.kill()
+            process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {path}")
+
+
+def read_pcm(path, sample_rate, channels):
+    """
+    Decodes the whole audio stream of `path` into one (frames, channels)
+    int16 array, without any intermediate file.
+    """
+    chunks = list(stream_pcm(path, sample_rate, channels))
+    if not chunks:
+        return np.zeros((0, channels), dtype=np.int16)
+    return np.concatenate(chunks)
+
+
+@contextmanager
+def pcm_encoder(output_path, sample_rate, channels, output_format=None, quality=None):
+    """
+    Yields a `write(samples)` function that pipes int16 (frames, channels)
+    arrays into an ffmpeg process encoding `output_path` as `output_format`
+    (by default the file extension) at `quality`.
+    """
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        str(channels),
+        "-i",
+        "-",
+        *encoder_args(output_format or format_from_path(output_path), quality),
+        output_path,
+    ]
+    encoder = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(samples):
+        encoder.stdin.write(memoryview(np.ascontiguousarray(samples, dtype=np.int16)))
+
+    try:
+        yield write
+    finally:
+        encoder.stdin.close()
+        encoder.wait()
+
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {output_path}")
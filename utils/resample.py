@@ -0,0 +1,75 @@
+import numpy as np
+import soxr
+
+RESAMPLE_QUALITY = "HQ"
+
+
+def target_format(formats):
+    """
+    The (frame_rate, channels) every input is converted to before mixing:
+    the highest of each, as pydub's implicit sync would pick.
+    """
+    formats = list(formats)
+    return max(rate for rate, _ in formats), max(channels for _, channels in formats)
+
+
+def remix_channels(samples, channels):
+    """
+    Converts (frames, n) int16 samples to `channels`: mono is copied to
+    every channel and anything to mono is averaged, like pydub.
+    """
+    current = samples.shape[1]
+    if current == channels:
+        return samples
+    if current == 1:
+        return np.repeat(samples, channels, axis=1)
+    if channels == 1:
+        return samples.mean(axis=1, dtype=np.float32, keepdims=True).astype(np.int16)
+    raise ValueError(f"Cannot remix {current} channels to {channels}.")
+
+
+def convert_samples(samples, frame_rate, target_rate, target_channels):
+    """
+    Resamples and remixes a whole (frames, channels) int16 array in one
+    vectorised soxr call. Channels are dropped before resampling and added
+    after it, so soxr never works on more channels than it has to.
+    """
+    if target_channels < samples.shape[1]:
+        samples = remix_channels(samples, target_channels)
+    if frame_rate != target_rate:
+        samples = soxr.resample(samples, frame_rate, target_rate, RESAMPLE_QUALITY)
+    return remix_channels(samples, target_channels)
+
+
+def convert_stream(chunks, frame_rate, channels, target_rate, target_channels):
+    """
+    convert_samples for an iterable of (frames, channels) int16 chunks, with
+    one soxr stream carrying the filter state across chunk boundaries.
+    """
+    if (frame_rate, channels) == (target_rate, target_channels):
+        yield from chunks
+        return
+
+    resampler = None
+    if frame_rate != target_rate:
+        resampler = soxr.ResampleStream(
+            frame_rate,
+            target_rate,
+            min(channels, target_channels),
+            dtype="int16",
+            quality=RESAMPLE_QUALITY,
+        )
+
+    for chunk in chunks:
+        if target_channels < channels:
+            chunk = remix_channels(chunk, target_channels)
+        if resampler is not None:
+            chunk = resampler.resample_chunk(chunk)
+        yield remix_channels(chunk, target_channels)
+
+    if resampler is not None:
+        # Flush the samples still inside the filter
+        tail = resampler.resample_chunk(
+            np.zeros((0, min(channels, target_channels)), dtype=np.int16), last=True
+        )
+        yield remix_channels(tail, target_channels)
@@ -0,0 +1,579 @@
+import logging
+import numpy as np
+
+from utils.pcm_stream import PCM_CHUNK_MS, probe_audio_format, stream_pcm
+
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+ENVELOPE_BLOCK_MS = 10000
+
+# Denoising needs the whole track in memory, which streaming detection avoids
+STREAMING_DENOISE_ERROR = (
+    "streaming_detection cannot be combined with remove_background_noise."
+)
+
+
+class LoudnessEnvelope:
+    """
+    Per-millisecond energy of a decoded audio track.
+
+    `power[i]` is the mean square amplitude of millisecond `i`, normalised so
+    that a full-scale signal has power 1.0. `counts[i]` is the number of
+    samples (frames * channels) pydub would see in that millisecond, which is
+    what makes windowed RMS values computed from the envelope match pydub.
+    `max_amplitude` is kept for integer sources so threshold comparisons can
+    use the same integer RMS that audioop reports.
+    """
+
+    def __init__(self, power, counts, max_amplitude=None):
+        self.power = np.asarray(power, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.max_amplitude = max_amplitude
+
+    def __len__(self):
+        return len(self.power)
+
+    @property
+    def duration_ms(self):
+        return len(self.power)
+
+    def window_power(self, window_ms):
+        """
+        Mean power of every `window_ms` wide window, one value per start
+        millisecond, computed from cumulative sums in a single pass.
+        """
+        weighted = np.concatenate(([0.0], np.cumsum(self.power * self.counts)))
+        samples = np.concatenate(([0], np.cumsum(self.counts)))
+        starts = np.arange(0, len(self.power) - window_ms + 1)
+        total = weighted[starts + window_ms] - weighted[starts]
+        count = samples[starts + window_ms] - samples[starts]
+        return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+    def mean_volume(self):
+        """
+        Mean volume in dBFS over the whole track, as ffmpeg volumedetect
+        reports it.
+        """
+        total = float(np.dot(self.power, self.counts))
+        samples = int(self.counts.sum())
+        if not total or not samples:
+            return -float("infinity")
+        return float(10 * np.log10(total / samples))
+
+    def dbfs(self):
+        with np.errstate(divide="ignore"):
+            return 10 * np.log10(self.power)
+
+
+def frame_boundaries(duration_ms, frame_rate):
+    # Same rounding pydub uses when slicing by milliseconds
+    return (np.arange(duration_ms + 1, dtype=np.int64) * frame_rate / 1000.0).astype(
+        np.int64
+    )
+
+
+def segment_samples(audio_segment):
+    dtype = SAMPLE_DTYPES.get(audio_segment.sample_width)
+    if dtype is None:
+        raise ValueError(
+            f"Unsupported sample width: {audio_segment.sample_width} bytes."
+        )
+    samples = np.frombuffer(audio_segment.raw_data, dtype=dtype)
+    return samples.reshape(-1, audio_segment.channels)
+
+
+def millisecond_energy(samples, edges):
+    """
+    Sum of squared samples between consecutive frame offsets in `edges`.
+    """
+    channels = samples.shape[1]
+    squares = np.square(samples[: edges[-1]].ravel(), dtype=np.float64)
+    offsets = edges[:-1] * channels
+
+    if not len(squares):
+        return np.zeros(len(offsets))
+
+    # reduceat needs in-range offsets and returns a single element for empty
+    # slices, so those are zeroed afterwards.
+    padded = np.concatenate((squares, np.zeros(1)))
+    energy = np.add.reduceat(padded, np.minimum(offsets, len(squares)))
+    energy[edges[:-1] >= edges[1:]] = 0.0
+    return energy
+
+
+def compute_energy_envelope(samples, frame_rate, max_amplitude, duration_ms=None):
+    """
+    Builds a LoudnessEnvelope from a (frames, channels) integer or float array.
+    """
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+
+    frame_count, channels = samples.shape
+
+    if duration_ms is None:
+        duration_ms = int(round(1000 * frame_count / float(frame_rate)))
+
+    bounds = frame_boundaries(duration_ms, frame_rate)
+    counts = np.diff(bounds) * channels
+
+    energy = np.zeros(duration_ms)
+    usable = min(frame_count, bounds[-1])
+
+    # Work through the PCM in blocks so the float64 squares never exceed a
+    # few megabytes, however long the input is.
+    for block_start in range(0, duration_ms, ENVELOPE_BLOCK_MS):
+        block_end = min(block_start + ENVELOPE_BLOCK_MS, duration_ms)
+        first = min(bounds[block_start], usable)
+        edges = np.minimum(bounds[block_start : block_end + 1], usable) - first
+        energy[block_start:block_end] = millisecond_energy(samples[first:], edges)
+
+    energy /= float(max_amplitude) ** 2
+
+    power = np.divide(energy, counts, out=np.zeros_like(energy), where=counts > 0)
+    max_amplitude = max_amplitude if np.issubdtype(samples.dtype, np.integer) else None
+    return LoudnessEnvelope(power, counts, max_amplitude)
+
+
+def envelope_from_segment(audio_segment):
+    return compute_energy_envelope(
+        segment_samples(audio_segment),
+        audio_segment.frame_rate,
+        audio_segment.max_possible_amplitude,
+        duration_ms=len(audio_segment),
+    )
+
+
+def silent_windows(window_power, silence_thresh, max_amplitude=None):
+    threshold = 10 ** (silence_thresh / 20.0)
+    rms = np.sqrt(window_power)
+
+    if max_amplitude:
+        # audioop.rms truncates to an integer before pydub compares it
+        # against the threshold, so do the same for integer sources.
+        return np.floor(rms * max_amplitude) <= threshold * max_amplitude
+
+    return rms <= threshold
+
+
+def envelope_from_file(path, chunk_ms=PCM_CHUNK_MS):
+    """
+    Builds a LoudnessEnvelope by streaming `path` through an ffmpeg pipe, so
+    only one chunk of PCM is held at a time. `chunk_ms` must be a whole
+    number of seconds to keep chunk edges on exact millisecond frames.
+    """
+    sample_rate, channels = probe_audio_format(path)
+    power = []
+    counts = []
+    frames = 0
+    ms_done = 0
+
+    for samples in stream_pcm(path, sample_rate, channels, chunk_ms=chunk_ms):
+        frames += len(samples)
+        duration_ms = min(
+            int(round(1000 * frames / float(sample_rate))) - ms_done, chunk_ms
+        )
+        envelope = compute_energy_envelope(
+            samples, sample_rate, 32768, duration_ms=duration_ms
+        )
+        power.append(envelope.power)
+        counts.append(envelope.counts)
+        ms_done += duration_ms
+
+    return LoudnessEnvelope(
+        np.concatenate(power) if power else np.zeros(0),
+        np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64),
+        32768,
+    )
+
+
+def detect_silent_ranges(envelope, min_silence_len, silence_thresh):
+    """
+    Vectorised equivalent of pydub.silence.detect_silence with seek_step=1.
+    """
+    seg_len = len(envelope)
+    if seg_len < min_silence_len:
+        return []
+
+    window_power = envelope.window_power(min_silence_len)
+
+    silent = silent_windows(window_power, silence_thresh, envelope.max_amplitude)
+
+    silence_starts = np.flatnonzero(silent)
+    if not len(silence_starts):
+        return []
+
+    gaps = np.diff(silence_starts)
+    breaks = np.flatnonzero((gaps != 1) & (gaps > min_silence_len))
+
+    range_starts = silence_starts[np.concatenate(([0], breaks + 1))]
+    range_ends = (
+        silence_starts[np.concatenate((breaks, [len(silence_starts) - 1]))]
+        + min_silence_len
+    )
+
+    return [[int(s), int(e)] for s, e in zip(range_starts, range_ends)]
+
+
+def detect_nonsilent_ranges(envelope, min_silence_len, silence_thresh):
+    """
+    Vectorised equivalent of pydub.silence.detect_nonsilent.
+    """
+    silent_ranges = detect_silent_ranges(envelope, min_silence_len, silence_thresh)
+    seg_len = len(envelope)
+
+    if not silent_ranges:
+        return [[0, seg_len]]
+
+    if silent_ranges[0][0] == 0 and silent_ranges[0][1] == seg_len:
+        return []
+
+    nonsilent_ranges = []
+    prev_end = 0
+    for start, end in silent_ranges:
+        nonsilent_ranges.append([prev_end, start])
+        prev_end = end
+
+    if silent_ranges[-1][1] != seg_len:
+        nonsilent_ranges.append([prev_end, seg_len])
+
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+
+    return nonsilent_ranges
+
+
+def detect_nonsilent_fast(audio_segment, min_silence_len=1000, silence_thresh=-16):
+    """
+    Drop-in replacement for pydub.silence.detect_nonsilent that works on a
+    NumPy energy envelope instead of slicing the segment every millisecond.
+    """
+    envelope = envelope_from_segment(audio_segment)
+    nonsilent_ranges = detect_nonsilent_ranges(
+        envelope, min_silence_len, silence_thresh
+    )
+    logging.info(f"[NONSILENT_RANGES_DETECTED]: {len(nonsilent_ranges)}")
+    return nonsilent_ranges
+
+
+def candidate_thresholds(silence_threshold, threshold_increment=-5, attempts=3):
+    """
+    The thresholds process_video/process_audio used to try one full job at a
+    time, in the same order.
+    """
+    return [silence_threshold + threshold_increment * i for i in range(attempts)]
+
+
+def pad_ranges(nonsilent_ranges, padding):
+    return [(start - padding, end + padding) for start, end in nonsilent_ranges]
+
+
+def merge_ranges(nonsilent_ranges, duration_ms):
+    """
+    Clips padded ranges to the media and joins the ones that overlap, for
+    renderers that select time spans rather than concatenating slices.
+    """
+    merged = []
+    for start, end in sorted(nonsilent_ranges):
+        start, end = max(start, 0), min(end, duration_ms)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def validate_cut_list(nonsilent_ranges, duration_ms=None):
+    """
+    Checks a client-supplied cut list: [start, end] pairs in ms with
+    0 <= start < end, sorted by start and starting inside the media. Returns
+    it merged and clipped to `duration_ms`; raises ValueError otherwise.
+    """
+    if not nonsilent_ranges:
+        raise ValueError("nonsilent_ranges must contain at least one range.")
+
+    previous_start = 0
+    for index, cut in enumerate(nonsilent_ranges):
+        if len(cut) != 2:
+            raise ValueError(f"Range {index} must be a [start, end] pair.")
+        start, end = cut
+        if not 0 <= start < end:
+            raise ValueError(f"Range {index} must satisfy 0 <= start < end.")
+        if start < previous_start:
+            raise ValueError("nonsilent_ranges must be sorted by start.")
+        if duration_ms is not None and start >= duration_ms:
+            raise ValueError(f"Range {index} starts past the end of the media.")
+        previous_start = start
+
+    return merge_ranges(
+        nonsilent_ranges, duration_ms if duration_ms is not None else float("inf")
+    )
+
+
+def kept_duration_ms(nonsilent_ranges, duration_ms):
+    return sum(
+        max(min(end, duration_ms) - max(start, 0), 0) for start, end in nonsilent_ranges
+    )
+
+
+def select_nonsilent_ranges(
+    envelope,
+    thresholds,
+    min_silence_len,
+    padding,
+    max_kept_ratio,
+    fallback_threshold=None,
+):
+    """
+    Evaluates every candidate threshold against one envelope and returns
+    `(threshold, padded_ranges)` for the first whose cut list keeps less than
+    `max_kept_ratio` of the input; see choose_cut_list for the fallback.
+    """
+    candidates = [
+        (
+            silence_thresh,
+            detect_nonsilent_ranges(envelope, min_silence_len, silence_thresh),
+        )
+        for silence_thresh in thresholds
+    ]
+    return choose_cut_list(
+        candidates, len(envelope), padding, max_kept_ratio, fallback_threshold
+    )
+
+
+def choose_cut_list(
+    candidates, duration_ms, padding, max_kept_ratio, fallback_threshold=None
+):
+    """
+    Picks the cut list from `(threshold, nonsilent_ranges)` pairs, in order.
+    When none keeps less than `max_kept_ratio`, falls back to the
+    `fallback_threshold` candidate (the mean-volume threshold, which is what
+    the old retry loop rendered after its last attempt), or to the last
+    candidate that kept anything when that one is missing or empty.
+    """
+    fallback = None
+
+    for silence_thresh, nonsilent_ranges in candidates:
+        nonsilent_ranges = pad_ranges(nonsilent_ranges, padding)
+        if not nonsilent_ranges:
+            logging.info(f"[THRESHOLD_REJECTED_ALL_SILENT]: {silence_thresh}")
+            continue
+
+        final_duration = kept_duration_ms(nonsilent_ranges, duration_ms)
+        logging.info(
+            f"[THRESHOLD_CANDIDATE]: {silence_thresh} [ORIGINAL_DURATION]: {duration_ms} [FINAL_DURATION]: {final_duration}"
+        )
+
+        if duration_ms > final_duration and final_duration < (
+            max_kept_ratio * duration_ms
+        ):
+            return silence_thresh, nonsilent_ranges
+
+        if fallback is None or fallback[0] != fallback_threshold:
+            fallback = (silence_thresh, nonsilent_ranges)
+
+    if fallback is None:
+        raise ValueError("nonsilent_ranges is None or empty.")
+
+    logging.info(f"[THRESHOLD_FALLBACK]: {fallback[0]}")
+    return fallback
+
+
+class StreamingSilenceDetector:
+    """
+    Incremental equivalent of detect_nonsilent_ranges for PCM that arrives in
+    chunks. Only the last `min_silence_len` milliseconds of energy and the
+    open silent range are carried between chunks, so memory does not grow
+    with the input duration.
+
+    `feed()` and `finish()` return the nonsilent ranges that became final.
+    """
+
+    def __init__(
+        self,
+        frame_rate,
+        channels,
+        min_silence_len,
+        silence_thresh,
+        max_amplitude=32768,
+    ):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.min_silence_len = min_silence_len
+        self.silence_thresh = silence_thresh
+        self.max_amplitude = max_amplitude
+
+        # Frames received but not yet assigned to a finished millisecond
+        self.pending = np.zeros((0, channels), dtype=np.int16)
+        self.pending_start = 0
+        self.frames_received = 0
+
+        # Per-millisecond energy from `window_start` up to `ms_done`
+        self.energy = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.window_start = 0
+        self.ms_done = 0
+
+        # Silent range bookkeeping, mirroring pydub's merge loop
+        self.range_start = None
+        self.prev_silence_start = None
+        self.prev_end = 0
+        self.found_silence = False
+
+    def _ms_edge(self, ms):
+        return int(ms * self.frame_rate / 1000.0)
+
+    def _add_milliseconds(self, last_ms, frame_limit):
+        if last_ms <= self.ms_done:
+            return
+
+        bounds = frame_boundaries(last_ms, self.frame_rate)[self.ms_done :]
+        edges = np.minimum(bounds, frame_limit) - self.pending_start
+        energy = millisecond_energy(self.pending, edges)
+        energy /= float(self.max_amplitude) ** 2
+
+        consumed = edges[-1]
+        self.pending = self.pending[consumed:]
+        self.pending_start += consumed
+
+        self.energy = np.concatenate((self.energy, energy))
+        self.counts = np.concatenate((self.counts, np.diff(bounds) * self.channels))
+        self.ms_done = last_ms
+
+    def _scan_windows(self):
+        last_start = self.ms_done - self.min_silence_len
+        if last_start < self.window_start:
+            return []
+
+        energy = np.concatenate(([0.0], np.cumsum(self.energy)))
+        samples = np.concatenate(([0], np.cumsum(self.counts)))
+        offsets = np.arange(0, last_start - self.window_start + 1)
+        total = energy[offsets + self.min_silence_len] - energy[offsets]
+        count = samples[offsets + self.min_silence_len] - samples[offsets]
+        window_power = np.divide(
+            total, count, out=np.zeros_like(total), where=count > 0
+        )
+
+        silence_starts = (
+            np.flatnonzero(
+                silent_windows(window_power, self.silence_thresh, self.max_amplitude)
+            )
+            + self.window_start
+        )
+
+        # Keep the energy the next windows still overlap
+        drop = last_start + 1 - self.window_start
+        self.energy = self.energy[drop:]
+        self.counts = self.counts[drop:]
+        self.window_start = last_start + 1
+
+        return self._merge(silence_starts)
+
+    def _merge(self, silence_starts):
+        finished = []
+        for silence_start in silence_starts.tolist():
+            if self.prev_silence_start is None:
+                self.range_start = silence_start
+            else:
+                gap = silence_start - self.prev_silence_start
+                if gap != 1 and gap > self.min_silence_len:
+                    finished.extend(
+                        self._close_range(
+                            self.prev_silence_start + self.min_silence_len
+                        )
+                    )
+                    self.range_start = silence_start
+            self.prev_silence_start = silence_start
+        return finished
+
+    def _close_range(self, end):
+        nonsilent = [self.prev_end, self.range_start]
+        self.prev_end = end
+        self.found_silence = True
+        return [] if nonsilent == [0, 0] else [nonsilent]
+
+    def feed(self, samples):
+        samples = samples.reshape(-1, self.channels)
+        self.pending = np.concatenate((self.pending, samples))
+        self.frames_received += len(samples)
+
+        # A millisecond is final once every frame it spans has arrived
+        last_ms = int(self.frames_received * 1000 / self.frame_rate)
+        while self._ms_edge(last_ms) > self.frames_received:
+            last_ms -= 1
+        while self._ms_edge(last_ms + 1) <= self.frames_received:
+            last_ms += 1
+
+        self._add_milliseconds(last_ms, self.frames_received)
+        return self._scan_windows()
+
+    def finish(self):
+        duration_ms = int(round(1000 * self.frames_received / float(self.frame_rate)))
+
+        if duration_ms < self.min_silence_len:
+            return [[0, duration_ms]]
+
+        # Same as pydub: the tail rounds to the nearest millisecond and any
+        # missing frames count as digital silence.
+        if duration_ms > self.ms_done:
+            self._add_milliseconds(duration_ms, self.frames_received)
+        finished = self._scan_windows()
+
+        if self.prev_silence_start is not None:
+            finished.extend(
+                self._close_range(self.prev_silence_start + self.min_silence_len)
+            )
+
+        if not self.found_silence:
+            return [[0, duration_ms]]
+
+        if self.prev_end != duration_ms:
+            finished.append([self.prev_end, duration_ms])
+
+        return finished
+
+
+def iter_nonsilent_ranges(path, min_silence_len, silence_thresh, chunk_ms=PCM_CHUNK_MS):
+    """
+    Yields the nonsilent ranges of a media file as they are found, decoding it
+    through an ffmpeg pipe in `chunk_ms` pieces.
+    """
+    sample_rate, channels = probe_audio_format(path)
+    detector = StreamingSilenceDetector(
+        sample_rate, channels, min_silence_len, silence_thresh
+    )
+
+    for samples in stream_pcm(path, sample_rate, channels, chunk_ms=chunk_ms):
+        yield from detector.feed(samples)
+
+    yield from detector.finish()
+
+
+def detect_nonsilent_streaming(
+    path, thresholds, min_silence_len, chunk_ms=PCM_CHUNK_MS
+):
+    """
+    Runs one StreamingSilenceDetector per candidate threshold over a single
+    decode of `path`. Returns `([(threshold, nonsilent_ranges), ...],
+    duration_ms)` ready for choose_cut_list.
+    """
+    sample_rate, channels = probe_audio_format(path)
+    detectors = [
+        StreamingSilenceDetector(sample_rate, channels, min_silence_len, silence_thresh)
+        for silence_thresh in thresholds
+    ]
+    ranges = [[] for _ in detectors]
+    frames = 0
+
+    for samples in stream_pcm(path, sample_rate, channels, chunk_ms=chunk_ms):
+        frames += len(samples)
+        for detector, found in zip(detectors, ranges):
+            found.extend(detector.feed(samples))
+
+    for detector, found in zip(detectors, ranges):
+        found.extend(detector.finish())
+
+    duration_ms = int(round(1000 * frames / float(sample_rate)))
+    logging.info(f"[STREAMING_DETECTION_DONE]: {duration_ms}ms")
+
+    return list(zip(thresholds, ranges)), duration_ms
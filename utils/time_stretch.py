@@ -0,0 +1,82 @@
+import logging
+import math
+import subprocess
+import threading
+
+import numpy as np
+
+from utils.audio_encoding import encoder_args, format_from_path
+
+# Tempo range a single atempo filter accepts on every ffmpeg build
+ATEMPO_MIN = 0.5
+ATEMPO_MAX = 2.0
+
+
+def atempo_chain(speed_factor):
+    """
+    atempo filter string for `speed_factor`, split into equal stages inside
+    ATEMPO_MIN..ATEMPO_MAX when the factor is outside that range.
+    """
+    if not speed_factor or speed_factor <= 0:
+        raise ValueError(f"Speed factor must be positive, got {speed_factor}.")
+
+    stages = math.ceil(abs(math.log(speed_factor)) / math.log(ATEMPO_MAX) - 1e-9)
+    stages = max(stages, 1)
+    stage_factor = speed_factor ** (1 / stages)
+    return ",".join([f"atempo={stage_factor:.8f}"] * stages)
+
+
+def time_stretch(
+    input_path, output_path, speed_factor, output_format=None, quality=None
+):
+    """
+    Changes the tempo of `input_path` by `speed_factor` (above 1 is faster,
+    below 1 slower) without changing pitch. ffmpeg's WSOLA-based atempo runs
+    between the decoder and the encoder, so audio is streamed through in
+    small frames and never held whole in memory. The output is encoded as
+    `output_format` (by default the file extension) at `quality`.
+    """
+    filters = atempo_chain(speed_factor)
+    logging.info(f"[TIME_STRETCH]: {speed_factor}x ({filters})")
+
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", input_path, "-vn"]
+    cmd += ["-filter:a", filters]
+    cmd += encoder_args(output_format or format_from_path(output_path), quality)
+    cmd += [output_path]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return output_path
+
+
+def stretch_samples(samples, frame_rate, speed_factor):
+    """
+    In-memory time_stretch for (frames, channels) int16 samples: raw PCM
+    goes through atempo over ffmpeg's stdin and stdout, with no file or
+    intermediate encode.
+    """
+    filters = atempo_chain(speed_factor)
+    channels = samples.shape[1]
+    logging.info(f"[TIME_STRETCH]: {speed_factor}x ({filters})")
+
+    pcm_args = ["-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels)]
+    cmd = ["ffmpeg", "-v", "error", *pcm_args, "-i", "-", "-filter:a", filters]
+    cmd += [*pcm_args, "-"]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def feed():
+        # Written from a thread so a full stdout pipe can't stall stdin
+        try:
+            process.stdin.write(memoryview(np.ascontiguousarray(samples)))
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+
+    writer = threading.Thread(target=feed)
+    writer.start()
+    output = process.stdout.read()
+    writer.join()
+    process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to change speed by {speed_factor}")
+    return np.frombuffer(output, dtype=np.int16).reshape(-1, channels)
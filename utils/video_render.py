@@ -0,0 +1,466 @@
+import logging
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils.media_info import probe_media
+
+RENDER_MODES = ("moviepy", "smart", "ffmpeg", "parallel")
+
+# Codecs whose GOPs can be stream-copied next to our own libx264 pieces
+SMART_RENDER_CODECS = ("h264",)
+
+X264_PROFILES = {
+    "baseline": "baseline",
+    "constrained baseline": "baseline",
+    "main": "main",
+    "high": "high",
+    "high 10": "high10",
+    "high 4:2:2": "high422",
+    "high 4:4:4 predictive": "high444",
+}
+
+# Pieces shorter than this are dropped; they are below one frame
+MIN_PIECE_SEC = 0.001
+
+
+def run_ffmpeg(args):
+    cmd = ["ffmpeg", "-y", "-v", "error", *args]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logging.error(f"FFmpeg stderr: {result.stderr.decode(errors='replace')}")
+        raise RuntimeError(f"ffmpeg failed: {' '.join(cmd)}")
+
+
+def keyframe_times(path, start_time=0.0):
+    """
+    Presentation times (seconds from the start of the file) of every video
+    keyframe, read from the packet flags so nothing is decoded.
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=print_section=0",
+        path,
+    ]
+    result = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        logging.error(f"FFprobe stderr: {result.stderr}")
+        raise RuntimeError(f"ffprobe failed to index keyframes of {path}")
+
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.append(float(pts_time) - start_time)
+
+    return np.unique(np.array(times, dtype=np.float64))
+
+
+def plan_smart_segments(ranges, keyframes):
+    """
+    Splits every kept (start, end) range in seconds into pieces: the whole
+    GOPs that lie completely inside it are copied, the partial GOPs at either
+    edge are re-encoded. Returns a list of (start, end, copy).
+    """
+    pieces = []
+    for start, end in ranges:
+        first = np.searchsorted(keyframes, start, side="left")
+        last = np.searchsorted(keyframes, end, side="right") - 1
+
+        if first < len(keyframes) and last > first:
+            copy_start, copy_end = keyframes[first], keyframes[last]
+            parts = [
+                (start, copy_start, False),
+                (copy_start, copy_end, True),
+                (copy_end, end, False),
+            ]
+        else:
+            # No complete GOP inside the range
+            parts = [(start, end, False)]
+
+        pieces.extend(part for part in parts if part[1] - part[0] >= MIN_PIECE_SEC)
+
+    return pieces
+
+
+def _encoder_args(stream):
+    """
+    libx264 settings matching the source `stream` (a MediaInfo.video dict),
+    so re-encoded pieces can sit next to stream-copied GOPs.
+    """
+    args = ["-c:v", "libx264", "-preset", "faster"]
+    profile = X264_PROFILES.get(str(stream["profile"] or "").lower())
+    if profile:
+        args += ["-profile:v", profile]
+    if stream["level"] and int(stream["level"]) > 0:
+        args += ["-level:v", f"{int(stream['level']) / 10:.1f}"]
+    if stream["pix_fmt"]:
+        args += ["-pix_fmt", stream["pix_fmt"]]
+    args += ["-b:v", str(stream["bit_rate"] or "1500k")]
+    return args + _threads_args()
+
+
+def _render_piece(input_path, start, end, copy, stream, piece_path):
+    if copy:
+        # Seek just past the keyframe so rounding never lands on the one
+        # before it; stream copy always starts at a keyframe anyway.
+        args = ["-ss", f"{start + MIN_PIECE_SEC:.6f}", "-i", input_path]
+        codec_args = ["-c:v", "copy", "-bsf:v", "h264_mp4toannexb"]
+    else:
+        args = ["-ss", f"{start:.6f}", "-i", input_path]
+        codec_args = _encoder_args(stream)
+
+    run_ffmpeg(
+        args
+        + ["-t", f"{end - start:.6f}", "-map", "0:v:0", "-an"]
+        + codec_args
+        + ["-f", "mpegts", piece_path]
+    )
+
+
+def write_cut_filter(ranges, filter_path, video=True, audio=True):
+    """
+    Writes a trim/atrim + concat filter graph keeping `ranges` (seconds) of
+    the first video and/or audio stream, for use with -filter_complex_script.
+    Output labels are [vout] and [aout].
+    """
+    lines = []
+    labels = ""
+    for index, (start, end) in enumerate(ranges):
+        bounds = f"start={start:.6f}:end={end:.6f}"
+        if video:
+            lines.append(f"[0:v:0]trim={bounds},setpts=PTS-STARTPTS[v{index}];")
+            labels += f"[v{index}]"
+        if audio:
+            lines.append(f"[0:a:0]atrim={bounds},asetpts=PTS-STARTPTS[a{index}];")
+            labels += f"[a{index}]"
+
+    outputs = ("[vout]" if video else "") + ("[aout]" if audio else "")
+    lines.append(
+        f"{labels}concat=n={len(ranges)}:v={int(video)}:a={int(audio)}{outputs}"
+    )
+
+    with open(filter_path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def _threads_args(threads=None):
+    threads = threads or os.environ.get("PROCESS_THREADS")
+    return ["-threads", str(threads)] if threads else []
+
+
+def can_smart_render(media_info):
+    return (
+        media_info.has_video and media_info.video["codec_name"] in SMART_RENDER_CODECS
+    )
+
+
+def snap_to_frames(ranges, media_info):
+    """
+    Rounds (start, end) ranges in seconds to the video's frame boundaries, so
+    every piece is a whole number of frames and audio cut over the same
+    ranges lines up with the video exactly. Ranges that round away are
+    dropped.
+    """
+    frame_rate = media_info.video["frame_rate"] if media_info.has_video else None
+    if not frame_rate:
+        return ranges
+    ranges = [
+        (round(s * frame_rate) / frame_rate, round(e * frame_rate) / frame_rate)
+        for s, e in ranges
+    ]
+    return [(s, e) for s, e in ranges if e > s]
+
+
+def render_smart(input_path, nonsilent_ranges, output_path, temp_dir, media_info=None):
+    """
+    Renders the kept `nonsilent_ranges` (ms, sorted and non-overlapping) by
+    stream-copying untouched GOPs and re-encoding only the partial GOPs at
+    the cut edges, then joining the pieces with the concat demuxer. Audio is
+    cut and encoded once in a separate pass so it stays sample-accurate.
+    """
+    media_info = media_info or probe_media(input_path)
+    stream = media_info.video
+    keyframes = keyframe_times(input_path, media_info.start_time)
+
+    ranges = snap_to_frames(
+        [(start / 1000, end / 1000) for start, end in nonsilent_ranges], media_info
+    )
+
+    pieces = plan_smart_segments(ranges, keyframes)
+    copied = sum(end - start for start, end, copy in pieces if copy)
+    total = sum(end - start for start, end, _ in pieces)
+    logging.info(
+        f"[SMART_RENDER_PLAN]: {len(pieces)} pieces, "
+        f"{copied:.1f}s of {total:.1f}s stream-copied"
+    )
+
+    render_dir = os.path.join(temp_dir, "smart_render")
+    os.makedirs(render_dir, exist_ok=True)
+
+    concat_list_path = os.path.join(render_dir, "pieces.txt")
+    with open(concat_list_path, "w") as concat_list:
+        for index, (start, end, copy) in enumerate(pieces):
+            piece_path = os.path.join(render_dir, f"piece_{index:05d}.ts")
+            _render_piece(input_path, start, end, copy, stream, piece_path)
+            concat_list.write(f"file '{piece_path}'\n")
+
+    inputs = ["-f", "concat", "-safe", "0", "-i", concat_list_path]
+    maps = ["-map", "0:v:0"]
+
+    if media_info.has_audio:
+        filter_path = os.path.join(render_dir, "audio_filter.txt")
+        audio_path = os.path.join(render_dir, "audio.m4a")
+        write_cut_filter(ranges, filter_path, video=False)
+        run_ffmpeg(
+            [
+                "-i",
+                input_path,
+                "-filter_complex_script",
+                filter_path,
+                "-map",
+                "[aout]",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "128k",
+                audio_path,
+            ]
+        )
+        inputs += ["-i", audio_path]
+        maps += ["-map", "1:a:0"]
+
+    run_ffmpeg(inputs + maps + ["-c", "copy", "-movflags", "+faststart", output_path])
+
+    logging.info(f"[SMART_RENDER_DONE]: {output_path}")
+    return output_path
+
+
+def encode_ranges(
+    input_path,
+    ranges,
+    output_path,
+    filter_path,
+    video=True,
+    audio=True,
+    threads=None,
+    frame_rate=None,
+):
+    """
+    Cuts `ranges` (seconds, sorted) out of the input and encodes them with
+    one ffmpeg process. The input is seeked to the first range and read only
+    up to the last one, so a group from the middle of a long file does not
+    decode everything before it. `frame_rate` forces constant-rate output.
+    """
+    if not ranges:
+        raise ValueError("No ranges to render.")
+
+    span_start, span_end = ranges[0][0], ranges[-1][1]
+    shifted = [(start - span_start, end - span_start) for start, end in ranges]
+    write_cut_filter(shifted, filter_path, video=video, audio=audio)
+
+    args = [
+        "-ss",
+        f"{span_start:.6f}",
+        "-t",
+        f"{span_end - span_start:.6f}",
+        "-i",
+        input_path,
+        "-filter_complex_script",
+        filter_path,
+    ]
+    if video:
+        args += ["-map", "[vout]", "-c:v", "libx264", "-preset", "faster"]
+        args += ["-b:v", "1500k"] + _threads_args(threads)
+        if frame_rate:
+            args += ["-r", str(frame_rate)]
+    if audio:
+        args += ["-map", "[aout]", "-c:a", "aac", "-b:a", "128k"]
+
+    run_ffmpeg(args + ["-movflags", "+faststart", output_path])
+    return output_path
+
+
+def render_filtergraph(
+    input_path, nonsilent_ranges, output_path, temp_dir, media_info=None
+):
+    """
+    Renders the kept `nonsilent_ranges` (ms, sorted and non-overlapping) with
+    one ffmpeg process: a single trim/atrim/concat graph decodes, cuts and
+    encodes video and AAC audio in one pass.
+    """
+    media_info = media_info or probe_media(input_path)
+    ranges = [(start / 1000, end / 1000) for start, end in nonsilent_ranges]
+
+    logging.info(f"[FILTERGRAPH_RENDER_STARTED]: {len(ranges)} ranges")
+    encode_ranges(
+        input_path,
+        ranges,
+        output_path,
+        os.path.join(temp_dir, "cut_filter.txt"),
+        audio=media_info.has_audio,
+    )
+
+    logging.info(f"[FILTERGRAPH_RENDER_DONE]: {output_path}")
+    return output_path
+
+
+def split_range_groups(ranges, groups):
+    """
+    Splits sorted `ranges` into at most `groups` contiguous groups of roughly
+    equal kept duration. Groups only ever break between two ranges, i.e. at
+    a cut that is already in the output.
+    """
+    total = sum(end - start for start, end in ranges)
+    target = total / max(groups, 1)
+
+    split = [[]]
+    kept = 0.0
+    for start, end in ranges:
+        if split[-1] and kept >= target * len(split) and len(split) < groups:
+            split.append([])
+        split[-1].append((start, end))
+        kept += end - start
+
+    return [group for group in split if group]
+
+
+def parallel_render_settings(workers=None, threads=None):
+    """
+    Number of segments encoded at once and x264 threads per segment. Read
+    from RENDER_WORKERS/RENDER_SEGMENT_THREADS, defaulting to splitting the
+    worker's PROCESS_THREADS (or CPU count) budget across the segments.
+    """
+    budget = int(os.environ.get("PROCESS_THREADS") or os.cpu_count() or 1)
+    workers = int(workers or os.environ.get("RENDER_WORKERS") or budget)
+    threads = int(
+        threads
+        or os.environ.get("RENDER_SEGMENT_THREADS")
+        or max(budget // max(workers, 1), 1)
+    )
+    return max(workers, 1), threads
+
+
+def render_parallel(
+    input_path,
+    nonsilent_ranges,
+    output_path,
+    temp_dir,
+    media_info=None,
+    workers=None,
+    threads=None,
+):
+    """
+    Splits the kept ranges into contiguous groups, encodes every group's
+    video to its own segment concurrently, and joins the segments with the
+    concat demuxer without re-encoding. Audio is cut and encoded once,
+    alongside the video segments, so there are no AAC priming gaps at the
+    segment joins.
+    """
+    media_info = media_info or probe_media(input_path)
+    workers, threads = parallel_render_settings(workers, threads)
+
+    # The video groups and the single audio pass cut the same frame-aligned
+    # ranges, so per-range rounding can't accumulate into A/V drift.
+    ranges = snap_to_frames(
+        [(start / 1000, end / 1000) for start, end in nonsilent_ranges], media_info
+    )
+    if not ranges:
+        raise ValueError("No ranges to render.")
+
+    groups = split_range_groups(ranges, workers)
+    logging.info(
+        f"[PARALLEL_RENDER_STARTED]: {len(groups)} segments, "
+        f"{workers} workers x {threads} threads"
+    )
+
+    render_dir = os.path.join(temp_dir, "parallel_render")
+    os.makedirs(render_dir, exist_ok=True)
+
+    # Each job is an ffmpeg child process, so threads are enough to keep
+    # every core busy, and unlike a process pool they also work inside
+    # daemonic Celery pool workers.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        segment_jobs = []
+        for index, group in enumerate(groups):
+            segment_path = os.path.join(render_dir, f"segment_{index:03d}.mp4")
+            filter_path = os.path.join(render_dir, f"segment_{index:03d}.txt")
+            segment_jobs.append(
+                executor.submit(
+                    encode_ranges,
+                    input_path,
+                    group,
+                    segment_path,
+                    filter_path,
+                    audio=False,
+                    threads=threads,
+                )
+            )
+
+        audio_job = None
+        if media_info.has_audio:
+            audio_job = executor.submit(
+                encode_ranges,
+                input_path,
+                ranges,
+                os.path.join(render_dir, "audio.m4a"),
+                os.path.join(render_dir, "audio_filter.txt"),
+                video=False,
+            )
+
+        segment_paths = [job.result() for job in segment_jobs]
+        audio_path = audio_job.result() if audio_job else None
+
+    concat_list_path = os.path.join(render_dir, "segments.txt")
+    with open(concat_list_path, "w") as concat_list:
+        for segment_path in segment_paths:
+            concat_list.write(f"file '{segment_path}'\n")
+
+    inputs = ["-f", "concat", "-safe", "0", "-i", concat_list_path]
+    maps = ["-map", "0:v:0"]
+    if audio_path:
+        inputs += ["-i", audio_path]
+        maps += ["-map", "1:a:0"]
+
+    run_ffmpeg(inputs + maps + ["-c", "copy", "-movflags", "+faststart", output_path])
+
+    logging.info(f"[PARALLEL_RENDER_DONE]: {output_path}")
+    return output_path
+
+
+def render_video(
+    render_mode,
+    input_path,
+    nonsilent_ranges,
+    output_path,
+    temp_dir,
+    media_info=None,
+):
+    """
+    Renders with one of the ffmpeg-based modes. Sources the smart renderer
+    cannot stream-copy are rendered through the filter graph instead.
+    """
+    media_info = media_info or probe_media(input_path)
+
+    if render_mode == "smart" and not can_smart_render(media_info):
+        logging.info(f"[SMART_RENDER_UNSUPPORTED_CODEC]: {input_path}")
+        render_mode = "ffmpeg"
+
+    args = (input_path, nonsilent_ranges, output_path, temp_dir, media_info)
+    if render_mode == "smart":
+        return render_smart(*args)
+    if render_mode == "ffmpeg":
+        return render_filtergraph(*args)
+    if render_mode == "parallel":
+        return render_parallel(*args)
+    raise ValueError(f"Invalid render_mode: {render_mode}")
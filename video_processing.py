@@ -3,9 +3,21 @@ from remove_silence import *
 from file_operations import *
 from communication import *
 from video_subtitle_generator import *
+from utils.silence_detector import candidate_thresholds
+from distributed_render import (
+    dispatch_distributed_render,
+    distributed_render_available,
+    plan_distributed_render,
+)
 import zipfile
 from uuid import uuid4
 
+# Another attempt would re-run the same analysis and hit these again
+FINAL_ERRORS = (
+    "The video does not contain any detectable audio.",
+    "The video does not contain any silence.",
+)
+
 
 def create_zip_file(output_files, zip_file_path):
     with zipfile.ZipFile(zip_file_path, "w") as zipf:
@@ -30,6 +42,9 @@ def process_video(
     run_locally=False,
     run_bulk=False,
     task_type="remove_silence_video",
+    streaming_detection=False,
+    nonsilent_ranges=None,
+    render_mode="moviepy",
 ):
     logging.info(
         f"[VIDEO_PROCESSING_STARTING]: {input_video_url}, {unique_uuid}. [USER]: {userId}"
@@ -38,15 +53,30 @@ def process_video(
     output_files = []
     error_messages = []
 
+    distributed = render_mode == "distributed"
+    if distributed:
+        # Chunks are spread over the cluster only for single, remote jobs;
+        # everything else renders on this worker's cores.
+        render_mode = "parallel"
+        distributed = (
+            distributed_render_available()
+            and not run_bulk
+            and not run_locally
+            and task_type == "remove_silence_video"
+        )
+
     if run_bulk:
         for input_video_url in input_video_urls:
             output_video_s3_url = None
             attempts = 0
             max_attempts = 3
-            threshold_increment = -5
             error_message = None
             job_id = str(uuid4())
 
+            # Every threshold a retry would have tried is evaluated up front
+            # from one analysis pass; retries only cover transient failures.
+            threshold_candidates = candidate_thresholds(silence_threshold)
+
             logging.info(
                 f"[BULK_VIDEO_PROCESSING_STARTING]: {input_video_url}, {unique_uuid}. [USER]: {userId}"
             )
@@ -66,6 +96,9 @@ def process_video(
                             generate_xml=False,
                             run_locally=run_locally,
                             run_bulk=True,
+                            threshold_candidates=threshold_candidates,
+                            streaming_detection=streaming_detection,
+                            render_mode=render_mode,
                         )
                     elif task_type == "generate_subtitles":
                         local_path, _, metrics = generate_subtitles(
@@ -93,16 +126,12 @@ def process_video(
                     error_messages.append(
                         f"Error processing {input_video_url}: {friendly_error}"
                     )
-                    if (
-                        "The video does not contain any detectable audio."
-                        in friendly_error
-                    ):
+                    if friendly_error in FINAL_ERRORS:
                         break
                     else:
                         attempts += 1
-                        silence_threshold += threshold_increment
                         logging.warning(
-                            f"Adjusting silence threshold to {silence_threshold}. Attempt {attempts}/{max_attempts}."
+                            f"Retrying {input_video_url}. Attempt {attempts}/{max_attempts}."
                         )
 
         if output_files:
@@ -142,9 +171,44 @@ def process_video(
         output_video_s3_url = None
         attempts = 0
         max_attempts = 3
-        threshold_increment = -5
         error_message = None
 
+        # Every threshold a retry would have tried is evaluated up front
+        # from one analysis pass; retries only cover transient failures.
+        threshold_candidates = candidate_thresholds(silence_threshold)
+
+        if distributed:
+            try:
+                nonsilent_ranges, chunks, render_source = plan_distributed_render(
+                    temp_dir,
+                    input_video_url,
+                    unique_uuid,
+                    userId,
+                    silence_threshold,
+                    min_silence_duration,
+                    padding,
+                    remove_background_noise,
+                    nonsilent_ranges,
+                )
+                if len(chunks) > 1:
+                    dispatch_distributed_render(
+                        input_video_url,
+                        render_source,
+                        chunks,
+                        email,
+                        unique_uuid,
+                        userId,
+                        nonsilent_ranges,
+                    )
+                    # stitch_chunks notifies the user once every part is in
+                    if os.path.exists(temp_dir):
+                        shutil.rmtree(temp_dir)
+                    return output_files
+            except Exception as e:
+                logging.error(
+                    f"Distributed render unavailable, rendering locally. Error: {str(e)}"
+                )
+
         while attempts < max_attempts:
             try:
                 if task_type == "remove_silence_video":
@@ -160,6 +224,10 @@ def process_video(
                         generate_xml=False,
                         run_locally=run_locally,
                         run_bulk=False,
+                        threshold_candidates=threshold_candidates,
+                        streaming_detection=streaming_detection,
+                        nonsilent_ranges=nonsilent_ranges,
+                        render_mode=render_mode,
                     )
                     logging.info(
                         f"[VIDEO_PROCESSING_COMPLETED]: {output_video_s3_url} {unique_uuid}."
@@ -184,14 +252,11 @@ def process_video(
                 logging.error(f"Attempt {attempts + 1} failed. Error: {friendly_error}")
                 error_message = friendly_error
 
-                if "The video does not contain any detectable audio." in friendly_error:
+                if friendly_error in FINAL_ERRORS:
                     break
                 else:
                     attempts += 1
-                    silence_threshold += threshold_increment
-                    logging.warning(
-                        f"Adjusting silence threshold to {silence_threshold}. Attempt {attempts}/{max_attempts}."
-                    )
+                    logging.warning(f"Retrying. Attempt {attempts}/{max_attempts}.")
 
             finally:
                 if os.path.exists(temp_dir):
@@ -230,6 +295,8 @@ def handle_error(e):
         friendly_error = "The video does not contain any silence."
     elif "max() arg is an empty sequence" in str(e):
         friendly_error = "The video does not contain any detectable audio."
+    elif "No audio stream found" in str(e):
+        friendly_error = "The video does not contain any detectable audio."
     else:
         friendly_error = f"A processing error occurred: {str(e)}"
     return friendly_error
@@ -82,7 +82,7 @@ def generate_subtitles(
         os.environ["MOVIEPY_TEMP_FOLDER"] = temp_dir
 
         if not run_locally:
-            unique_video_local_path = convert_to_standard_format(
+            unique_video_local_path, _ = convert_to_standard_format(
                 unique_video_local_path, temp_dir
             )
 